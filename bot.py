@@ -1,11 +1,23 @@
 from atproto import Client
+from atproto_client.request import Request
+from concurrent.futures import ThreadPoolExecutor
+import httpx
 import os
 import re
 import time
+import heapq
 import json
+import random
+import sqlite3
+import threading
 import sys
+import bisect
+from contextlib import contextmanager
+from collections.abc import MutableMapping
+from collections import deque
 from datetime import datetime, timedelta, timezone
-from typing import Optional, Dict, List, Set, Tuple
+from urllib.parse import urlencode
+from typing import Any, Callable, Iterable, Iterator, Optional, Dict, List, Set, Tuple
 
 # Github Actions: print direct
 try:
@@ -13,8 +25,6 @@ try:
 except Exception:
     pass
 
-print("=== BLEUSKYPROMO BOT STARTED ===", flush=True)
-
 # ============================================================
 # CONFIG — leeg = skip
 # ============================================================
@@ -54,6 +64,8 @@ EXCLUDE_LISTS = {
 }
 
 HASHTAG_QUERY = "#bskypromo"
+# Meerdere zoekopdrachten: HASHTAG_QUERIES="#bskypromo,#kunst"
+HASHTAG_QUERIES = [q.strip() for q in os.getenv("HASHTAG_QUERIES", HASHTAG_QUERY).split(",") if q.strip()]
 
 PROMO_FEED_KEY = "feed 1"
 PROMO_LIST_KEY = "lijst 1"
@@ -64,14 +76,125 @@ PROMO_LIST_KEY = "lijst 1"
 HOURS_BACK = int(os.getenv("HOURS_BACK", "3"))
 MAX_PER_RUN = int(os.getenv("MAX_PER_RUN", "100"))
 MAX_PER_USER = int(os.getenv("MAX_PER_USER", "3"))
-SLEEP_SECONDS = float(os.getenv("SLEEP_SECONDS", "2"))
 
+# State: SQLite (point lookups, retention). STATE_FILE = oude JSON, eenmalig gemigreerd.
+STATE_DB = os.getenv("STATE_DB", "repost_state_bleuskypromo.db")
 STATE_FILE = os.getenv("STATE_FILE", "repost_state_bleuskypromo.json")
+# VACUUM pas als dit deel van de pages vrij is (niet bij elke prune)
+STATE_VACUUM_FREE_RATIO = float(os.getenv("STATE_VACUUM_FREE_RATIO", "0.25"))
+STATE_RETENTION_DAYS = int(os.getenv("STATE_RETENTION_DAYS", "30"))
+# State gelijktrekken met onze eigen repost/like records (listRecords, nieuwste eerst):
+# "incremental" stopt bij het eerste bekende record, "full" leest tot de retention grens
+# en ruimt ook entries op waarvan het record niet meer bestaat. "off" = overslaan.
+RECONCILE = os.getenv("RECONCILE", "incremental").strip().lower()
+
+# Write-ahead journal: elke repost/like direct weggeschreven, fsync per N regels
+JOURNAL_FILE = os.getenv("JOURNAL_FILE", STATE_DB + ".journal")
+JOURNAL_FSYNC_EVERY = int(os.getenv("JOURNAL_FSYNC_EVERY", "10"))
 
 LIST_MEMBER_LIMIT = int(os.getenv("LIST_MEMBER_LIMIT", "1500"))
 AUTHOR_POSTS_PER_MEMBER = int(os.getenv("AUTHOR_POSTS_PER_MEMBER", "10"))
 FEED_MAX_ITEMS = int(os.getenv("FEED_MAX_ITEMS", "500"))
-HASHTAG_MAX_ITEMS = int(os.getenv("HASHTAG_MAX_ITEMS", "100"))
+# searchPosts: pagineren tot de cutoff / vorige `since`; HASHTAG_MAX_PAGES is alleen een vangnet
+HASHTAG_PAGE_SIZE = min(int(os.getenv("HASHTAG_PAGE_SIZE", "100")), 100)
+HASHTAG_MAX_PAGES = int(os.getenv("HASHTAG_MAX_PAGES", "20"))  # per query per run
+HASHTAG_WORKERS = int(os.getenv("HASHTAG_WORKERS", "4"))
+
+# Lijsten: "feed" = app.bsky.feed.getListFeed (paar pagina's), "members" = author feed per lid
+LIST_SOURCE = os.getenv("LIST_SOURCE", "feed").strip().lower()
+LIST_FEED_MAX_ITEMS = int(os.getenv("LIST_FEED_MAX_ITEMS", "3000"))
+
+# Feeds: stop na zoveel pagina's op rij die volledig voor de cutoff vallen. Standaard uit (0):
+# ranked/"hot" feeds zetten oude posts vaak bovenaan. Per feed aanzetten met
+# "chronological": True (= 1) of "stale_pages": N; FEED_STALE_PAGES is de default voor de rest.
+FEED_STALE_PAGES = int(os.getenv("FEED_STALE_PAGES", "0"))
+
+# Geconfigureerde links -> at:// uri (incl. handle -> DID), in de state; na TTL opnieuw resolven
+LINK_CACHE_TTL_HOURS = int(os.getenv("LINK_CACHE_TTL_HOURS", "168"))
+
+# Lijstleden van bronlijsten uit de state cache, pas opnieuw ophalen na TTL
+LIST_CACHE_TTL_MINUTES = int(os.getenv("LIST_CACHE_TTL_MINUTES", "360"))
+# Exclude lijsten apart en kort: iemand ten onrechte reposten is de dure fout. 0 = elke run
+# (stream mode: elke EXCLUDE_STREAM_MIN_MINUTES). Mislukt de refresh, dan geldt de oude cache.
+EXCLUDE_CACHE_TTL_MINUTES = int(os.getenv("EXCLUDE_CACHE_TTL_MINUTES", "0"))
+EXCLUDE_STREAM_MIN_MINUTES = 5
+
+# Members-pad: stille leden minder vaak pollen (exponential backoff).
+# Max interval blijft onder HOURS_BACK zodat geen post buiten het venster valt.
+ACTIVITY_SCHEDULE = os.getenv("ACTIVITY_SCHEDULE", "1").strip() not in ("", "0", "false", "no")
+ACTIVITY_BASE_MINUTES = int(os.getenv("ACTIVITY_BASE_MINUTES", "30"))
+# Cron interval van de workflow; GitHub slaat soms een slot over, dus 2x marge op HOURS_BACK.
+RUN_INTERVAL_MINUTES = int(os.getenv("RUN_INTERVAL_MINUTES", "30"))
+ACTIVITY_MAX_CAP_MINUTES = max(HOURS_BACK * 60 - 2 * RUN_INTERVAL_MINUTES, 0)
+ACTIVITY_MAX_MINUTES = min(
+    int(os.getenv("ACTIVITY_MAX_MINUTES", str(ACTIVITY_MAX_CAP_MINUTES))), ACTIVITY_MAX_CAP_MINUTES
+)
+ACTIVITY_ACTIVE_GAP_MINUTES = int(os.getenv("ACTIVITY_ACTIVE_GAP_MINUTES", str(HOURS_BACK * 60)))
+
+# Writes: creates/deletes van meerdere kandidaten in één com.atproto.repo.applyWrites
+# (protocol max 200 writes per request). <= 1 = losse create/delete calls.
+APPLY_WRITES_BATCH = min(int(os.getenv("APPLY_WRITES_BATCH", "200")), 200)
+
+# PIPELINE=stream: bronnen parallel crawlen; promo wordt geschreven zodra de promo-bronnen
+# klaar zijn, de rest zodra alle andere bronnen klaar zijn. Alle bronnen worden altijd
+# gecrawld, dus selectie en state (since-marks, activiteit, carry-over) zijn identiek aan batch.
+PIPELINE = os.getenv("PIPELINE", "batch").strip().lower()
+SOURCE_WORKERS = int(os.getenv("SOURCE_WORKERS", "4"))
+
+# Carry-over: kandidaten die deze run niet aan de beurt kwamen (MAX_PER_RUN/MAX_PER_USER)
+# gaan naar een queue; de volgende run checkt ze via getPosts i.p.v. opnieuw te crawlen.
+# Bij meer dan CARRY_MAX_ITEMS krijgt elke bron beurtelings een plek (nieuwste eerst).
+CARRY_MAX_ITEMS = int(os.getenv("CARRY_MAX_ITEMS", "500"))
+CARRY_MAX_AGE_HOURS = int(os.getenv("CARRY_MAX_AGE_HOURS", str(max(HOURS_BACK, 24))))
+GET_POSTS_BATCH = 25  # max uris per app.bsky.feed.getPosts
+
+# Promo refresh (unrepost + repost) alleen als de laatste boost ouder is dan
+# PROMO_REFRESH_MINUTES, of als hij niet meer bij de PROMO_PROFILE_TOP nieuwste items op ons profiel staat.
+# Promo wordt als laatste van een run geschreven en staat daarna bovenaan; de normale reposts van
+# de run (tot MAX_PER_RUN) komen eronder. PROMO_PROFILE_TOP hoeft dus alleen het aantal promo posts
+# plus wat er tussen twee runs bij komt (handwerk) te dekken, niet MAX_PER_RUN.
+PROMO_REFRESH_MINUTES = int(os.getenv("PROMO_REFRESH_MINUTES", "240"))
+PROMO_PROFILE_TOP = int(os.getenv("PROMO_PROFILE_TOP", "25"))
+
+# Write budget van de PDS (punten): create 3, update 2, delete 1.
+# Bijgehouden over runs heen in de state; lager zetten = ruimte overlaten voor handwerk/scripts.
+WRITE_BUDGET_HOURLY = int(os.getenv("WRITE_BUDGET_HOURLY", "5000"))
+WRITE_BUDGET_DAILY = int(os.getenv("WRITE_BUDGET_DAILY", "35000"))
+
+# Parallelle author-feed crawl (gedeelde HTTP connection pool)
+AUTHOR_FEED_WORKERS = int(os.getenv("AUTHOR_FEED_WORKERS", "8"))
+HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "4"))
+HTTP_BACKOFF_SECONDS = float(os.getenv("HTTP_BACKOFF_SECONDS", "1"))
+# Langste wachttijd per retry (retry-after, ratelimit-reset of backoff). Langer = opgeven:
+# de run loopt niet vol in het cron-slot, de rest gaat via de carry-over queue.
+HTTP_MAX_RETRY_WAIT = float(os.getenv("HTTP_MAX_RETRY_WAIT", "60"))
+
+# Rate limiter: startsnelheid (requests/s) per bucket; daarna bijgestuurd
+# op de ratelimit-* headers van de server.
+READ_RATE = float(os.getenv("READ_RATE", "10"))
+WRITE_RATE = float(os.getenv("WRITE_RATE", "2"))
+RATE_BURST = float(os.getenv("RATE_BURST", "10"))
+
+# Run metrics (calls/latency/bytes per nsid, tijd per fase, filterredenen) als JSON; leeg = uit
+METRICS_FILE = os.getenv("METRICS_FILE", "run_metrics.json").strip()
+
+# XRPC endpoint; leeg = bsky.social. Bijv. scripts/fake_xrpc.py voor lokale benchmarks.
+BSKY_BASE_URL = os.getenv("BSKY_BASE_URL", "").strip() or None
+
+# Sessie hergebruiken tussen runs (createSession is zwaar rate-limited).
+# Bevat een langlevend refresh token: alleen lokaal/op een eigen host, nooit in git of een
+# gedeelde cache. Leeg = niets opslaan, elke run createSession (zo draait de workflow).
+SESSION_FILE = os.getenv("SESSION_FILE", ".bsky_session_bleuskypromo.json").strip()
+
+# RUN_MODE=stream: langlopende daemon op Jetstream i.p.v. polling.
+# JETSTREAM_REPLAY_FILE = JSONL met opgenomen Jetstream events (lokaal testen).
+RUN_MODE = os.getenv("RUN_MODE", "poll").strip().lower()
+JETSTREAM_URL = os.getenv("JETSTREAM_URL", "wss://jetstream2.us-east.bsky.network/subscribe")
+JETSTREAM_REPLAY_FILE = os.getenv("JETSTREAM_REPLAY_FILE", "").strip()
+STREAM_MAX_SECONDS = int(os.getenv("STREAM_MAX_SECONDS", "0"))
+STREAM_CHECKPOINT_SECONDS = int(os.getenv("STREAM_CHECKPOINT_SECONDS", "60"))
+STREAM_TICK_SECONDS = max(min(STREAM_CHECKPOINT_SECONDS, 30), 1)  # stille stream: toch checkpointen
+STREAM_MAX_PER_HOUR = int(os.getenv("STREAM_MAX_PER_HOUR", str(MAX_PER_RUN * 2)))
 
 # Secrets
 ENV_USERNAME = os.getenv("ENV_USERNAME", "BSKY_USERNAME_BP")
@@ -92,58 +215,308 @@ def utcnow() -> datetime:
     return datetime.now(timezone.utc)
 
 
-def parse_time(post) -> Optional[datetime]:
-    indexed = getattr(post, "indexedAt", None) or getattr(post, "indexed_at", None)
-    if indexed:
+LATENCY_BUCKETS_MS = (25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+class Metrics:
+    """
+    Tellers voor één run, thread-safe:
+    API calls per nsid (latency histogram, bytes, fouten, 429's), wall time per fase
+    en kandidaten behouden/gedropt per reden. Fases kunnen overlappen (PIPELINE=stream).
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        self.started = time.time()
+        self.calls: Dict[str, Dict[str, Any]] = {}
+        self.phases: Dict[str, float] = {}
+        self.candidates: Dict[str, int] = {}
+
+    def record_call(self, nsid: str, seconds: float, status: Optional[int], nbytes: int) -> None:
+        with self.lock:
+            c = self.calls.get(nsid)
+            if c is None:
+                c = self.calls[nsid] = {
+                    "calls": 0, "errors": 0, "throttled": 0, "bytes": 0, "seconds": 0.0,
+                    "latency_ms": [0] * (len(LATENCY_BUCKETS_MS) + 1),
+                }
+            c["calls"] += 1
+            c["seconds"] += seconds
+            c["bytes"] += nbytes
+            if status == 429:
+                c["throttled"] += 1
+            elif status is None or status >= 400:
+                c["errors"] += 1
+            c["latency_ms"][bisect.bisect_left(LATENCY_BUCKETS_MS, seconds * 1000)] += 1
+
+    def count(self, reason: str, n: int = 1) -> None:
+        with self.lock:
+            self.candidates[reason] = self.candidates.get(reason, 0) + n
+
+    @contextmanager
+    def phase(self, name: str):
+        t0 = time.perf_counter()
         try:
-            return datetime.fromisoformat(indexed.replace("Z", "+00:00"))
-        except Exception:
-            pass
+            yield
+        finally:
+            with self.lock:
+                self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - t0
+
+    def snapshot(self, **extra) -> Dict[str, Any]:
+        with self.lock:
+            calls = {k: dict(v, seconds=round(v["seconds"], 3)) for k, v in sorted(self.calls.items())}
+            return {
+                "started": datetime.fromtimestamp(self.started, timezone.utc).isoformat(),
+                "duration_s": round(time.time() - self.started, 3),
+                "latency_buckets_ms": list(LATENCY_BUCKETS_MS) + ["inf"],
+                "calls": calls,
+                "totals": {
+                    k: sum(v[k] for v in calls.values()) for k in ("calls", "errors", "throttled", "bytes")
+                },
+                "phases_s": {k: round(v, 3) for k, v in self.phases.items()},
+                "candidates": dict(sorted(self.candidates.items())),
+                **extra,
+            }
+
+    def write(self, path: str, **extra) -> None:
+        if not path:
+            return
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.snapshot(**extra), f, indent=2)
+        os.replace(tmp, path)
+
+
+METRICS = Metrics()
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket. `adapt` verdeelt het resterende server-budget
+    (ratelimit-remaining tot ratelimit-reset) over de tijd die nog rest.
+    """
+
+    def __init__(self, name: str, rate: float, burst: float):
+        self.name = name
+        self.rate = rate
+        self.burst = max(burst, 1.0)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+        # kosten per request in server-eenheden (points bij writes), geschat uit de headers
+        self.cost = 1.0
+        self.last_remaining: Optional[int] = None
+        self.last_reset: Optional[int] = None
+
+    def acquire(self) -> None:
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if now >= self.blocked_until and self.tokens >= 1.0:
+                    self.tokens -= 1.0
+                    return
+                wait = max(self.blocked_until - now, (1.0 - self.tokens) / self.rate)
+            time.sleep(wait)
+
+    def pause(self, seconds: float) -> None:
+        with self.lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+            self.tokens = 0.0
+
+    def adapt(self, headers) -> None:
+        try:
+            remaining = int(headers["ratelimit-remaining"])
+            reset = int(headers["ratelimit-reset"])
+        except (KeyError, TypeError, ValueError):
+            return
+        with self.lock:
+            if self.last_reset == reset and self.last_remaining is not None and remaining < self.last_remaining:
+                self.cost = 0.8 * self.cost + 0.2 * (self.last_remaining - remaining)
+            self.last_remaining = remaining
+            self.last_reset = reset
+            window = max(reset - time.time(), 1.0)
+            self.rate = max(remaining / window / max(self.cost, 1.0), 0.05)
+
+
+class RateLimitedRequest(Request):
+    """
+    Request met een gedeelde rate limiter (aparte buckets voor reads en writes)
+    en retry + exponential backoff op 429/5xx.
+    Writes (POST) worden alleen op 429 herhaald: een 5xx kan al verwerkt zijn.
+    """
 
-    record = getattr(post, "record", None)
-    if record:
-        created = getattr(record, "createdAt", None) or getattr(record, "created_at", None)
-        if created:
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.buckets = {
+            "read": TokenBucket("read", READ_RATE, RATE_BURST),
+            "write": TokenBucket("write", WRITE_RATE, RATE_BURST),
+        }
+
+    def _send_request(self, method: str, url: str, **kwargs):
+        nsid = url.rsplit("/", 1)[-1].split("?", 1)[0]
+        bucket = self.buckets["read" if method == "GET" else "write"]
+        # sessie-endpoints hebben eigen (strenge) limieten; niet gebruiken om bij te sturen
+        adaptive = not nsid.startswith("com.atproto.server.")
+        attempt = 0
+        while True:
+            bucket.acquire()
+            t0 = time.perf_counter()
             try:
-                return datetime.fromisoformat(created.replace("Z", "+00:00"))
-            except Exception:
-                pass
-    return None
+                response = super()._send_request(method, url, **kwargs)
+            except Exception as e:
+                response = getattr(e, "response", None)
+                status = getattr(response, "status_code", None)
+                METRICS.record_call(nsid, time.perf_counter() - t0, status, 0)
+                if adaptive and response is not None:
+                    bucket.adapt(response.headers)
+                retryable = status == 429 or (method == "GET" and (status is None or status >= 500))
+                if not retryable or attempt >= HTTP_MAX_RETRIES:
+                    raise
+                delay = retry_delay(response, attempt)
+                if delay > HTTP_MAX_RETRY_WAIT:
+                    log(f"⛔ HTTP {status or 'error'} op {nsid} — wachttijd {delay:.0f}s te lang, opgegeven")
+                    raise
+                attempt += 1
+                if status == 429:
+                    bucket.pause(delay)
+                log(f"⏳ HTTP {status or 'error'} op {nsid} — retry {attempt} over {delay:.1f}s")
+                time.sleep(delay)
+                continue
+            METRICS.record_call(nsid, time.perf_counter() - t0, response.status_code, len(response.content or b""))
+            if adaptive:
+                bucket.adapt(response.headers)
+            return response
 
 
-def is_quote_post(record) -> bool:
-    embed = getattr(record, "embed", None)
-    if not embed:
-        return False
-    return bool(getattr(embed, "record", None) or getattr(embed, "recordWithMedia", None))
+def retry_delay(response, attempt: int) -> float:
+    # ongecapt: de aanroeper geeft op boven HTTP_MAX_RETRY_WAIT
+    headers = getattr(response, "headers", None) or {}
+    retry_after = headers.get("retry-after")
+    if retry_after:
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            pass
+    reset = headers.get("ratelimit-reset")
+    if reset:
+        try:
+            return max(0.0, float(reset) - time.time())
+        except ValueError:
+            pass
+    return HTTP_BACKOFF_SECONDS * (2 ** attempt)
+
 
+def make_client() -> Client:
+    # één httpx pool voor alle threads; keep-alive connections worden hergebruikt
+    pool = max(AUTHOR_FEED_WORKERS, 1)
+    limits = httpx.Limits(max_connections=pool, max_keepalive_connections=pool)
+    return Client(BSKY_BASE_URL, request=RateLimitedRequest(limits=limits))
 
-def has_media(record) -> bool:
+
+def login_client(client: Client, username: str, password: str, session_path: str) -> None:
     """
-    Alleen echte media: images/video.
-    External-only (link-card) telt NIET als media.
+    Login via de opgeslagen sessie (refresh gaat automatisch bij een verlopen access token).
+    Alleen als dat mislukt volgt een volledige createSession.
+    Elke nieuwe/ververste sessie wordt direct weggeschreven. Lege `session_path` = altijd createSession.
     """
-    embed = getattr(record, "embed", None)
-    if not embed:
-        return False
+    if not session_path:
+        client.login(username, password)
+        return
 
-    if getattr(embed, "images", None):
-        return True
-    if getattr(embed, "video", None):
-        return True
+    def store_session(event, session) -> None:
+        tmp = session_path + ".tmp"
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"username": username, "session": session.encode()}, f)
+        os.replace(tmp, session_path)
 
-    if getattr(embed, "external", None):
-        return False
+    client.on_session_change(store_session)
+
+    if os.path.exists(session_path):
+        try:
+            with open(session_path, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+            if saved.get("username") == username and saved.get("session"):
+                client.login(session_string=saved["session"])
+                log("🔑 Sessie hergebruikt")
+                return
+        except Exception as e:
+            log(f"⚠️ Opgeslagen sessie onbruikbaar ({e}) — opnieuw inloggen")
+
+    client.login(username, password)
+
+
+def parse_iso(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except (TypeError, ValueError):
+        return None
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+
+def raw_post_flags(record: Dict) -> Tuple[bool, bool, bool]:
+    """
+    (reply, quote, media) voor een ruwe post record (dict).
+    Alleen echte media: images/video. External-only (link-card) telt NIET als media.
+    """
+    embed = record.get("embed") or {}
+    quote = bool(embed.get("record") or embed.get("recordWithMedia"))
+    media = bool(embed.get("images") or embed.get("video"))
+    return bool(record.get("reply")), quote, media
 
-    rwm = getattr(embed, "recordWithMedia", None)
-    if rwm and getattr(rwm, "media", None):
-        m = rwm.media
-        if getattr(m, "images", None):
-            return True
-        if getattr(m, "video", None):
-            return True
 
-    return False
+class PostRecord:
+    """
+    Compacte post, direct uit de ruwe XRPC JSON (geen atproto models).
+    Bevat alleen de velden die de filters gebruiken.
+    """
+
+    __slots__ = (
+        "uri", "cid", "author_did", "author_handle", "indexed_at", "created_at",
+        "is_reply", "is_quote", "has_media", "reason", "reason_at",
+    )
+
+    def __init__(self, post: Dict, reason: Optional[Dict] = None):
+        record = post.get("record") or {}
+        author = post.get("author") or {}
+        self.uri: Optional[str] = post.get("uri")
+        self.cid: Optional[str] = post.get("cid")
+        self.author_did: str = (author.get("did") or "").lower()
+        self.author_handle: str = (author.get("handle") or "").lower()
+        self.indexed_at = parse_iso(post.get("indexedAt"))
+        self.created_at = parse_iso(record.get("createdAt"))
+        self.is_reply, self.is_quote, self.has_media = raw_post_flags(record)
+        # repost/pin in een feed: type + moment van de repost
+        self.reason: Optional[str] = (reason.get("$type") or "reason") if reason else None
+        self.reason_at = parse_iso(reason.get("indexedAt")) if reason else None
+
+    @property
+    def time(self) -> Optional[datetime]:
+        return self.indexed_at or self.created_at
+
+    @property
+    def sort_at(self) -> Optional[datetime]:
+        # reposts in een feed staan op het moment van de repost, niet van de post
+        return self.reason_at or self.time
+
+
+def post_records(feed: List[Dict]) -> List[PostRecord]:
+    return [PostRecord(item["post"], item.get("reason")) for item in feed if item.get("post")]
+
+
+def xrpc_query(client: Client, nsid: str, params: Dict) -> Dict:
+    # ruwe JSON: slaat de model-laag over voor de drukke read endpoints
+    query = urlencode({k: v for k, v in params.items() if v is not None}, doseq=True)
+    out = client.invoke_query(f"{nsid}?{query}")
+    return out.content if isinstance(out.content, dict) else {}
 
 
 def resolve_handle_to_did(client: Client, actor: str) -> Optional[str]:
@@ -190,18 +563,337 @@ def normalize_list_uri(client: Client, s: str) -> Optional[str]:
     return f"at://{did}/app.bsky.graph.list/{rkey}"
 
 
-def load_state(path: str) -> Dict:
+TID_ALPHABET = "234567abcdefghijklmnopqrstuvwxyz"
+
+
+def tid_timestamp(rkey: str) -> Optional[int]:
+    # record keys van reposts/likes zijn TIDs: 53 bits microseconden + 10 bits clock id
+    if len(rkey) != 13:
+        return None
+    value = 0
+    for ch in rkey:
+        i = TID_ALPHABET.find(ch)
+        if i < 0:
+            return None
+        value = (value << 5) | i
+    return (value >> 10) // 1_000_000
+
+
+TID_CLOCK_ID = random.randrange(1024)
+_tid_lock = threading.Lock()
+_last_tid_us = 0
+
+
+def new_tid() -> str:
+    global _last_tid_us
+    with _tid_lock:
+        us = max(time.time_ns() // 1000, _last_tid_us + 1)
+        _last_tid_us = us
+    value = (us << 10) | TID_CLOCK_ID
+    chars = []
+    for _ in range(13):
+        chars.append(TID_ALPHABET[value & 31])
+        value >>= 5
+    return "".join(reversed(chars))
+
+
+class RecordTable(MutableMapping):
+    """
+    subject uri -> record uri (repost of like), direct op SQLite.
+    Gedraagt zich als de oude dict, maar elke lookup is een index-lookup.
+    """
+
+    def __init__(self, conn: sqlite3.Connection, kind: str):
+        self.conn = conn
+        self.kind = kind
+
+    def __getitem__(self, subject: str) -> str:
+        row = self.conn.execute(
+            "SELECT uri FROM records WHERE kind = ? AND subject = ?", (self.kind, subject)
+        ).fetchone()
+        if row is None:
+            raise KeyError(subject)
+        return row[0]
+
+    def __setitem__(self, subject: str, uri: str) -> None:
+        # created_ts uit de TID van het record (retention klopt ook voor gereconcilieerde records)
+        parsed = parse_at_uri_rkey(uri)
+        ts = tid_timestamp(parsed[2]) if parsed else None
+        self.conn.execute(
+            "INSERT OR REPLACE INTO records (kind, subject, uri, created_ts) VALUES (?, ?, ?, ?)",
+            (self.kind, subject, uri, ts or int(time.time())),
+        )
+
+    def __delitem__(self, subject: str) -> None:
+        cur = self.conn.execute("DELETE FROM records WHERE kind = ? AND subject = ?", (self.kind, subject))
+        if cur.rowcount == 0:
+            raise KeyError(subject)
+
+    def __contains__(self, subject: object) -> bool:
+        return self.conn.execute(
+            "SELECT 1 FROM records WHERE kind = ? AND subject = ?", (self.kind, subject)
+        ).fetchone() is not None
+
+    def __iter__(self) -> Iterator[str]:
+        rows = self.conn.execute("SELECT subject FROM records WHERE kind = ?", (self.kind,)).fetchall()
+        return iter(r[0] for r in rows)
+
+    def __len__(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM records WHERE kind = ?", (self.kind,)).fetchone()[0]
+
+
+class StateDB:
+    """
+    Bot state in één SQLite bestand.
+    "repost_records"/"like_records" zijn RecordTables, al het andere zijn JSON blobs in `kv`.
+    """
+
+    TABLES = ("repost_records", "like_records")
+
+    def __init__(self, path: str):
+        self.path = path
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS records (
+                kind TEXT NOT NULL,
+                subject TEXT NOT NULL,
+                uri TEXT NOT NULL,
+                created_ts INTEGER NOT NULL,
+                PRIMARY KEY (kind, subject)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS records_created ON records (created_ts);
+            CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+            """
+        )
+        self.tables = {name: RecordTable(self.conn, name) for name in self.TABLES}
+        self._kv: Dict[str, Any] = {}
+
+    def __getitem__(self, key: str) -> Any:
+        if key in self.tables:
+            return self.tables[key]
+        if key not in self._kv:
+            row = self.conn.execute("SELECT value FROM kv WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                raise KeyError(key)
+            self._kv[key] = json.loads(row[0])
+        return self._kv[key]
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        if key in self.tables:
+            table = self.tables[key]
+            if value is not table:
+                table.clear()
+                table.update(value)
+            return
+        self._kv[key] = value
+
+    def __contains__(self, key: str) -> bool:
+        try:
+            self[key]
+            return True
+        except KeyError:
+            return False
+
+    def get(self, key: str, default: Any = None) -> Any:
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def setdefault(self, key: str, default: Any) -> Any:
+        try:
+            return self[key]
+        except KeyError:
+            self[key] = default
+            return default
+
+    def migrate_json(self, legacy: Dict) -> None:
+        now_ts = int(time.time())
+        for name in self.TABLES:
+            rows = []
+            for subject, uri in (legacy.get(name) or {}).items():
+                parsed = parse_at_uri_rkey(uri)
+                ts = tid_timestamp(parsed[2]) if parsed else None
+                rows.append((name, subject, uri, ts or now_ts))
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO records (kind, subject, uri, created_ts) VALUES (?, ?, ?, ?)", rows
+            )
+        for key, value in legacy.items():
+            if key not in self.TABLES:
+                self._kv[key] = value
+        self.save()
+
+    def prune(self, days: int) -> int:
+        if days <= 0:
+            return 0
+        cutoff_ts = int(time.time()) - days * 86400
+        cur = self.conn.execute("DELETE FROM records WHERE created_ts < ?", (cutoff_ts,))
+        return cur.rowcount
+
+    def save(self) -> None:
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO kv (key, value) VALUES (?, ?)",
+            [(k, json.dumps(v, ensure_ascii=False, separators=(",", ":"))) for k, v in self._kv.items()],
+        )
+        self.conn.commit()
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+def load_state(path: str) -> StateDB:
+    is_new = not os.path.exists(path)
+    state = StateDB(path)
+    if is_new and os.path.exists(STATE_FILE):
+        with open(STATE_FILE, "r", encoding="utf-8") as f:
+            legacy = json.load(f)
+        state.migrate_json(legacy)
+        # gemigreerd en gecommit: de JSON is nu alleen nog ballast in de repo
+        os.remove(STATE_FILE)
+        log(f"📦 State gemigreerd: {STATE_FILE} -> {path} (JSON verwijderd)")
+    return state
+
+
+def save_state(path: str, state: StateDB) -> None:
+    pruned = state.prune(STATE_RETENTION_DAYS)
+    state.save()
+    if pruned:
+        log(f"🧹 State: {pruned} records ouder dan {STATE_RETENTION_DAYS} dagen verwijderd")
+    # alleen compacteren als een flink deel van het bestand vrij is; vrije pages worden anders hergebruikt
+    free = state.conn.execute("PRAGMA freelist_count").fetchone()[0]
+    total = state.conn.execute("PRAGMA page_count").fetchone()[0]
+    if total and free / total >= STATE_VACUUM_FREE_RATIO:
+        state.conn.execute("VACUUM")
+        log(f"🗜️ State gecompacteerd ({free}/{total} pages vrij)")
+
+
+class ActionJournal:
+    """
+    Append-only JSONL met de records-stand per subject na elke actie.
+    Overleeft een crash/cancel; wordt bij de volgende start in de state gespeeld.
+    Een applyWrites batch wordt vóór de call als "gepland" gejournald (uris liggen vast
+    door de lokale TIDs) en daarna afgesloten; een open batch wordt na login geverifieerd.
+    """
+
+    def __init__(self, path: str, fsync_every: int):
+        self.path = path
+        self.fsync_every = max(fsync_every, 1)
+        self.pending = 0
+        self.f = open(path, "a", encoding="utf-8")
+
+    def append(self, subject: str, repost_uri: Optional[str], like_uri: Optional[str]) -> None:
+        self.f.write(json.dumps({"s": subject, "r": repost_uri, "l": like_uri}, separators=(",", ":")) + "\n")
+        # flush elke regel (overleeft een kill van het proces); fsync gebundeld (stroomuitval)
+        self.f.flush()
+        self.pending += 1
+        if self.pending >= self.fsync_every:
+            self.sync()
+
+    def plan(self, batch: str, entries: List[Tuple[str, Optional[str], Optional[str]]]) -> None:
+        # vóór de PDS call: als het proces tijdens de call sterft, weet de volgende run wat er kan staan
+        for subject, repost_uri, like_uri in entries:
+            entry = {"p": batch, "s": subject, "r": repost_uri, "l": like_uri}
+            self.f.write(json.dumps(entry, separators=(",", ":")) + "\n")
+        self.sync()
+
+    def resolve(self, batch: str) -> None:
+        # batch afgehandeld (uitkomsten staan erboven als gewone regels)
+        self.f.write(json.dumps({"d": batch}, separators=(",", ":")) + "\n")
+        self.f.flush()
+
+    def sync(self) -> None:
+        self.f.flush()
+        os.fsync(self.f.fileno())
+        self.pending = 0
+
+    def close(self) -> None:
+        if self.f.closed:
+            return
+        self.sync()
+        self.f.close()
+
+
+def replay_journal(path: str, state: StateDB) -> int:
     if not os.path.exists(path):
-        return {"repost_records": {}, "like_records": {}}
+        return 0
+    repost_records = state["repost_records"]
+    like_records = state["like_records"]
+    replayed = 0
+    planned: Dict[str, List[List]] = {}
     with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue  # half geschreven laatste regel
+            if "d" in entry:
+                planned.pop(entry["d"], None)
+                continue
+            subject = entry.get("s")
+            if not subject:
+                continue
+            if "p" in entry:
+                planned.setdefault(entry["p"], []).append([subject, entry.get("r"), entry.get("l")])
+                continue
+            for table, uri in ((repost_records, entry.get("r")), (like_records, entry.get("l"))):
+                if uri:
+                    table[subject] = uri
+                else:
+                    table.pop(subject, None)
+            replayed += 1
+    if planned:
+        # batch zonder afsluiting: onbekend of de PDS hem heeft; na login verifiëren
+        state.setdefault("journal_unconfirmed", {}).update(planned)
+    # compact: alles staat nu in de state, journal kan weg
+    state.save()
+    os.remove(path)
+    return replayed
+
+
+def error_status(e: Exception) -> Optional[int]:
+    # HTTP status van een mislukte XRPC call; None = geen antwoord (timeout, verbinding weg)
+    return getattr(getattr(e, "response", None), "status_code", None)
+
+
+def record_exists(client: Client, uri: str) -> Optional[bool]:
+    # None = niet vast te stellen (netwerk/5xx)
+    parsed = parse_at_uri_rkey(uri)
+    if not parsed:
+        return False
+    try:
+        did, collection, rkey = parsed
+        xrpc_query(client, "com.atproto.repo.getRecord", {"repo": did, "collection": collection, "rkey": rkey})
+        return True
+    except Exception as e:
+        return False if error_status(e) in (400, 404) else None
 
 
-def save_state(path: str, state: Dict) -> None:
-    tmp = path + ".tmp"
-    with open(tmp, "w", encoding="utf-8") as f:
-        json.dump(state, f, ensure_ascii=False, indent=2)
-    os.replace(tmp, path)
+def confirm_journal_batches(client: Client, state: StateDB) -> None:
+    """
+    Open batches uit het journal (proces stierf tijdens applyWrites): applyWrites is
+    atomair, dus één geplande record uri per batch zegt of de hele batch er staat.
+    """
+    unconfirmed: Dict[str, List[List]] = state.get("journal_unconfirmed") or {}
+    if not unconfirmed:
+        return
+    repost_records = state["repost_records"]
+    like_records = state["like_records"]
+    for batch, entries in list(unconfirmed.items()):
+        exists = record_exists(client, batch)
+        if exists is None:
+            continue  # volgende run opnieuw; RECONCILE vangt het intussen ook op
+        if exists:
+            for subject, repost_uri, like_uri in entries:
+                for table, uri in ((repost_records, repost_uri), (like_records, like_uri)):
+                    if uri:
+                        table[subject] = uri
+                    else:
+                        table.pop(subject, None)
+        log(f"📜 Journal batch {batch}: {len(entries)} kandidaten " + ("wel" if exists else "niet") + " geschreven")
+        del unconfirmed[batch]
+    state["journal_unconfirmed"] = unconfirmed
+    state.save()
 
 
 def parse_at_uri_rkey(uri: str) -> Optional[Tuple[str, str, str]]:
@@ -213,19 +905,76 @@ def parse_at_uri_rkey(uri: str) -> Optional[Tuple[str, str, str]]:
     return parts[0], parts[1], parts[2]
 
 
-def fetch_feed_items(client: Client, feed_uri: str, max_items: int) -> List:
-    items: List = []
+def page_is_stale(batch: List, cutoff: datetime) -> bool:
+    # alle items op de pagina vallen voor de cutoff (onbekende tijd telt als vers)
+    for item in batch:
+        t = item.sort_at
+        if t is None or t >= cutoff:
+            return False
+    return True
+
+
+def fetch_feed_items(
+    client: Client,
+    feed_uri: str,
+    max_items: int,
+    cutoff: Optional[datetime] = None,
+    stale_pages: int = 0,
+) -> List[PostRecord]:
+    """
+    Pagineert een feed tot `max_items`.
+    Met `cutoff` + `stale_pages` stopt het na zoveel opeenvolgende pagina's
+    zonder één item binnen de cutoff (chronologische feed: 1).
+    """
+    items: List[PostRecord] = []
     cursor = None
+    stale_run = 0
     while True:
         params = {"feed": feed_uri, "limit": 100}
         if cursor:
             params["cursor"] = cursor
-        out = client.app.bsky.feed.get_feed(params)
-        batch = getattr(out, "feed", []) or []
+        out = xrpc_query(client, "app.bsky.feed.getFeed", params)
+        batch = post_records(out.get("feed") or [])
         items.extend(batch)
-        cursor = getattr(out, "cursor", None)
+        cursor = out.get("cursor")
         if not cursor or len(items) >= max_items:
             break
+        if cutoff is not None and stale_pages > 0:
+            stale_run = stale_run + 1 if page_is_stale(batch, cutoff) else 0
+            if stale_run >= stale_pages:
+                break
+    return items[:max_items]
+
+
+def feed_stale_pages(obj: Dict) -> int:
+    if obj.get("chronological"):
+        return 1
+    try:
+        return int(obj.get("stale_pages", FEED_STALE_PAGES))
+    except (TypeError, ValueError):
+        return FEED_STALE_PAGES
+
+
+def fetch_list_feed_items(client: Client, list_uri: str, cutoff: datetime, max_items: int) -> List[PostRecord]:
+    """
+    Recente posts van alle leden via getListFeed (nieuwste eerst).
+    Stopt zodra een pagina voorbij `cutoff` reikt.
+    """
+    items: List[PostRecord] = []
+    cursor = None
+    while True:
+        params = {"list": list_uri, "limit": 100}
+        if cursor:
+            params["cursor"] = cursor
+        out = xrpc_query(client, "app.bsky.feed.getListFeed", params)
+        batch = post_records(out.get("feed") or [])
+        items.extend(batch)
+        cursor = out.get("cursor")
+        if not cursor or not batch or len(items) >= max_items:
+            break
+        times = [it.sort_at for it in batch if it.sort_at]
+        if times and min(times) < cutoff:
+            break
     return items[:max_items]
 
 
@@ -236,145 +985,352 @@ def fetch_list_members(client: Client, list_uri: str, limit: int) -> List[Tuple[
         params = {"list": list_uri, "limit": 100}
         if cursor:
             params["cursor"] = cursor
-        out = client.app.bsky.graph.get_list(params)
-        items = getattr(out, "items", []) or []
-        for it in items:
-            subj = getattr(it, "subject", None)
+        out = xrpc_query(client, "app.bsky.graph.getList", params)
+        for it in out.get("items") or []:
+            subj = it.get("subject")
             if not subj:
                 continue
-            h = (getattr(subj, "handle", "") or "").lower()
-            d = (getattr(subj, "did", "") or "").lower()
+            h = (subj.get("handle") or "").lower()
+            d = (subj.get("did") or "").lower()
             if h or d:
                 members.append((h, d))
             if len(members) >= limit:
                 return members[:limit]
-        cursor = getattr(out, "cursor", None)
+        cursor = out.get("cursor")
         if not cursor:
             break
     return members[:limit]
 
 
-def fetch_author_feed(client: Client, actor: str, limit: int) -> List:
+def pack_members(members: List[Tuple[str, str]]) -> str:
+    return "\n".join(f"{h}\t{d}" for h, d in members)
+
+
+def unpack_members(packed: str) -> List[Tuple[str, str]]:
+    members: List[Tuple[str, str]] = []
+    for line in packed.split("\n"):
+        if not line:
+            continue
+        h, _, d = line.partition("\t")
+        members.append((h, d))
+    return members
+
+
+def get_list_members_cached(
+    client: Client,
+    cache: Dict[str, Dict],
+    list_uri: str,
+    limit: int,
+    ttl_minutes: int = LIST_CACHE_TTL_MINUTES,
+) -> List[Tuple[str, str]]:
+    """
+    Lijstleden uit `cache` (state["list_members"]) zolang de TTL loopt.
+    Bij een mislukte refresh wordt de verlopen cache gebruikt.
+    """
+    entry = cache.get(list_uri)
+    if entry and entry.get("limit") == limit:
+        try:
+            fetched_at = datetime.fromisoformat(entry["fetched_at"])
+        except Exception:
+            fetched_at = None
+        if fetched_at and utcnow() - fetched_at < timedelta(minutes=ttl_minutes):
+            return unpack_members(entry.get("members", ""))
+
     try:
-        out = client.app.bsky.feed.get_author_feed({"actor": actor, "limit": limit})
-        return getattr(out, "feed", []) or []
-    except Exception:
-        return []
+        members = fetch_list_members(client, list_uri, limit)
+    except Exception as e:
+        if not entry:
+            raise
+        log(f"⚠️ Lijst refresh mislukt ({e}) — cache gebruikt voor {list_uri}")
+        return unpack_members(entry.get("members", ""))
+
+    cache[list_uri] = {"fetched_at": utcnow().isoformat(), "limit": limit, "members": pack_members(members)}
+    return members
 
 
-def fetch_hashtag_posts(client: Client, max_items: int) -> List:
+def fetch_author_feed(client: Client, actor: str, limit: int) -> Optional[List[PostRecord]]:
+    # None = ophalen mislukt (na retries); [] = auteur heeft echt niets
     try:
-        out = client.app.bsky.feed.search_posts({"q": HASHTAG_QUERY, "sort": "latest", "limit": max_items})
-        return getattr(out, "posts", []) or []
+        out = xrpc_query(client, "app.bsky.feed.getAuthorFeed", {"actor": actor, "limit": limit})
+        return post_records(out.get("feed") or [])
     except Exception:
-        return []
+        return None
 
 
-def build_candidates_from_feed_items(
-    items: List,
-    cutoff: datetime,
-    exclude_handles: Set[str],
-    exclude_dids: Set[str],
-    force_refresh: bool,
-) -> List[Dict]:
-    cands: List[Dict] = []
-    for item in items:
-        post = getattr(item, "post", None)
-        if not post:
-            continue
+def fetch_author_feeds(
+    client: Client, actors: List[str], limit: int, workers: int
+) -> List[Optional[List[PostRecord]]]:
+    """
+    Author feeds met begrensde concurrency.
+    Resultaat staat in dezelfde volgorde als `actors` (deterministische selectie);
+    None voor een feed die niet opgehaald kon worden.
+    """
+    if workers <= 1 or len(actors) <= 1:
+        return [fetch_author_feed(client, a, limit) for a in actors]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(lambda a: fetch_author_feed(client, a, limit), actors))
 
-        # skip boosts/reposts
-        if hasattr(item, "reason") and item.reason is not None:
-            continue
 
-        record = getattr(post, "record", None)
-        if not record:
-            continue
+def author_is_due(entry: Optional[List], now_ts: int) -> bool:
+    # entry = [last_seen_ts, gap_minutes, misses, next_poll_ts]
+    return not entry or now_ts >= entry[3]
 
-        if getattr(record, "reply", None):
+
+def update_author_activity(entry: Optional[List], items: List, now_ts: int) -> List:
+    """
+    Werkt het poll-schema van één auteur bij na een getAuthorFeed.
+    Nieuwe post of vaste poster -> elke run; anders backoff tot ACTIVITY_MAX_MINUTES.
+    """
+    times: List[int] = []
+    for it in items:
+        if it.reason is not None:
             continue
+        t = it.time
+        if t:
+            times.append(int(t.timestamp()))
+    times.sort(reverse=True)
+
+    prev_seen = entry[0] if entry else 0
+    last_seen = max(times[0], prev_seen) if times else prev_seen
+    if len(times) >= 2:
+        gap = max((times[0] - times[-1]) // 60 // (len(times) - 1), 1)
+    else:
+        gap = entry[1] if entry else 0
+
+    recent = bool(last_seen) and now_ts - last_seen <= 24 * 3600
+    active = last_seen > prev_seen or (recent and 0 < gap <= ACTIVITY_ACTIVE_GAP_MINUTES)
+    if active:
+        return [last_seen, gap, 0, now_ts]
+
+    misses = (entry[2] if entry else 0) + 1
+    wait = min(ACTIVITY_BASE_MINUTES * (2 ** misses), ACTIVITY_MAX_MINUTES)
+    return [last_seen, gap, misses, now_ts + wait * 60]
+
+
+def fetch_hashtag_posts(
+    client: Client,
+    query: str,
+    cutoff: datetime,
+    since: Optional[str],
+    max_pages: int,
+) -> Tuple[List[PostRecord], bool]:
+    """
+    searchPosts (latest) voor één query, gepagineerd tot de cutoff of de vorige `since`.
+    `since` = nieuwste indexedAt van de vorige volledige run; de server geeft alleen nieuwere posts.
+    Geeft (posts, compleet): compleet = het hele venster is gelezen (geen fout, vangnet niet geraakt).
+    """
+    posts: List[PostRecord] = []
+    cursor = None
+    since_dt = cutoff
+    if since:
+        try:
+            since_dt = max(cutoff, datetime.fromisoformat(since.replace("Z", "+00:00")))
+        except ValueError:
+            pass
+    since = since_dt.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
+    try:
+        for _ in range(max(max_pages, 1)):
+            params = {"q": query, "sort": "latest", "limit": HASHTAG_PAGE_SIZE, "since": since}
+            if cursor:
+                params["cursor"] = cursor
+            out = xrpc_query(client, "app.bsky.feed.searchPosts", params)
+            batch = [PostRecord(p) for p in out.get("posts") or []]
+            posts.extend(batch)
+            cursor = out.get("cursor")
+            if not cursor or not batch:
+                return posts, True
+            times = [p.time for p in batch if p.time]
+            if times and min(times) < since_dt:
+                return posts, True
+        log(f"⚠️ Hashtag search {query}: {max_pages} pagina's gelezen, venster niet rond — volgende run verder")
+    except Exception as e:
+        log(f"⚠️ Hashtag search mislukt voor {query}: {e}")
+    return posts, False
+
+
+def fetch_hashtag_searches(
+    client: Client,
+    queries: List[str],
+    cutoff: datetime,
+    since_marks: Dict[str, str],
+    max_pages: int,
+) -> List[Tuple[List[PostRecord], bool]]:
+    # parallel per query; resultaat (posts, compleet) in dezelfde volgorde als `queries`
+    def run(query: str) -> Tuple[List[PostRecord], bool]:
+        return fetch_hashtag_posts(client, query, cutoff, since_marks.get(query), max_pages)
+
+    if len(queries) <= 1 or HASHTAG_WORKERS <= 1:
+        return [run(q) for q in queries]
+    with ThreadPoolExecutor(max_workers=HASHTAG_WORKERS) as pool:
+        return list(pool.map(run, queries))
+
+
+def hashtag_mark(
+    prev: Optional[str], posts: List[PostRecord], complete: bool, cands: List[Dict], handled: Callable[[str], bool]
+) -> Optional[str]:
+    """
+    Nieuwe since-mark na de selectie. Alleen vooruit als het venster compleet gelezen is, en
+    niet verder dan de oudste kandidaat die niet gerepost en niet in de carry queue staat:
+    die komt de volgende run opnieuw uit de search (`since` is inclusief).
+    """
+    newest = max((p.time for p in posts if p.time), default=None)
+    if not complete or not newest:
+        return prev
+    open_times = [c["created"] for c in cands if not handled(c["uri"])]
+    return (min(open_times) if open_times else newest).isoformat()
+
 
-        if is_quote_post(record):
+def iter_candidates(
+    posts: Iterable[PostRecord],
+    cutoff: datetime,
+    exclude_handles: Set[str],
+    exclude_dids: Set[str],
+    force_refresh: bool,
+) -> Iterator[Dict]:
+    """
+    Eén filterstap voor feed items en post views (search).
+    Geen reposts/boosts, replies, quotes; alleen media, binnen de cutoff, niet excluded.
+    """
+    for post in posts:
+        # skip boosts/reposts
+        if post.reason is not None:
+            METRICS.count("drop_boost")
             continue
 
-        if not has_media(record):
+        if post.is_reply or post.is_quote or not post.has_media:
+            METRICS.count("drop_reply" if post.is_reply else "drop_quote" if post.is_quote else "drop_no_media")
             continue
 
-        uri = getattr(post, "uri", None)
-        cid = getattr(post, "cid", None)
+        uri = post.uri
+        cid = post.cid
         if not uri or not cid:
+            METRICS.count("drop_invalid")
             continue
 
-        author = getattr(post, "author", None)
-        ah = (getattr(author, "handle", "") or "").lower()
-        ad = (getattr(author, "did", "") or "").lower()
+        ah = post.author_handle
+        ad = post.author_did
 
         if ah in exclude_handles or ad in exclude_dids:
+            METRICS.count("drop_excluded")
             continue
 
-        created = parse_time(post)
+        created = post.time
         if not created or created < cutoff:
+            METRICS.count("drop_too_old")
             continue
 
-        cands.append({
+        METRICS.count("kept")
+        yield {
             "uri": uri,
             "cid": cid,
             "created": created,
             "author_key": ad or ah or uri,
             "force_refresh": force_refresh,
-        })
+        }
 
-    cands.sort(key=lambda x: x["created"])
-    return cands
 
-
-def build_candidates_from_postviews(
-    posts: List,
+def sorted_candidates(
+    posts: Iterable[PostRecord],
     cutoff: datetime,
     exclude_handles: Set[str],
     exclude_dids: Set[str],
+    force_refresh: bool,
 ) -> List[Dict]:
-    cands: List[Dict] = []
-    for post in posts:
-        record = getattr(post, "record", None)
-        if not record:
-            continue
-
-        if getattr(record, "reply", None):
-            continue
+    # één gesorteerde stream per bron, voor de k-way merge
+    return sorted(
+        iter_candidates(posts, cutoff, exclude_handles, exclude_dids, force_refresh),
+        key=lambda x: x["created"],
+    )
 
-        if is_quote_post(record):
-            continue
 
-        if not has_media(record):
-            continue
+def fair_order(cands: List[Dict]) -> Iterator[Dict]:
+    """
+    Beurtelings per auteur: eerst ieders oudste post, dan ieders tweede, enz.
+    Heap op (beurt, created), zodat één drukke poster de run niet opvult.
+    `cands` is al oudste-eerst gesorteerd.
+    """
+    queues: Dict[str, deque] = {}
+    for c in cands:
+        queues.setdefault(c["author_key"], deque()).append(c)
+    heap = [(0, q[0]["created"], i, q) for i, q in enumerate(queues.values())]
+    heapq.heapify(heap)
+    while heap:
+        turn, _, i, q = heapq.heappop(heap)
+        yield q.popleft()
+        if q:
+            heapq.heappush(heap, (turn + 1, q[0]["created"], i, q))
+
+
+def merge_candidates(ranked: Iterable[List[List[Dict]]]) -> Iterator[Dict]:
+    """
+    Tiers in prioriteitsvolgorde (promo, dan de rest); binnen een tier een heap-merge van
+    alle gesorteerde streams over de bronnen heen (oudste eerst) en daarna beurtelings per auteur.
+    Dedupe op uri tijdens het mergen: de eerdere tier (en bij gelijke tijd de eerdere stream) wint.
+    Wordt lui geconsumeerd, dus een tier wordt pas afgewacht als de selectie hem nodig heeft.
+    """
+    seen: Set[str] = set()
+    for streams in ranked:
+        fresh: List[Dict] = []
+        for c in heapq.merge(*streams, key=lambda x: x["created"]):
+            if c["uri"] in seen:
+                METRICS.count("drop_duplicate")
+                continue
+            seen.add(c["uri"])
+            fresh.append(c)
+        yield from fair_order(fresh)
 
-        uri = getattr(post, "uri", None)
-        cid = getattr(post, "cid", None)
-        if not uri or not cid:
-            continue
 
-        author = getattr(post, "author", None)
-        ah = (getattr(author, "handle", "") or "").lower()
-        ad = (getattr(author, "did", "") or "").lower()
+def fetch_posts(client: Client, uris: List[str], workers: int) -> List[PostRecord]:
+    """
+    Post views voor bekende uris via getPosts (GET_POSTS_BATCH per call).
+    Verwijderde posts komen niet terug; cid is de actuele.
+    """
+    batches = [uris[i:i + GET_POSTS_BATCH] for i in range(0, len(uris), GET_POSTS_BATCH)]
 
-        if ah in exclude_handles or ad in exclude_dids:
+    def one(batch: List[str]) -> List[PostRecord]:
+        try:
+            out = xrpc_query(client, "app.bsky.feed.getPosts", {"uris": batch})
+        except Exception as e:
+            log(f"⚠️ getPosts mislukt ({e})")
+            return []
+        return [PostRecord(p, None) for p in out.get("posts") or []]
+
+    if workers <= 1 or len(batches) <= 1:
+        return [p for b in batches for p in one(b)]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return [p for posts in pool.map(one, batches) for p in posts]
+
+
+def tag_source(streams: List[List[Dict]], label: str) -> List[List[Dict]]:
+    # herkomst onthouden (carry-kandidaten houden hun oorspronkelijke bron)
+    for st in streams:
+        for c in st:
+            c.setdefault("source", label)
+    return streams
+
+
+def carry_entries(
+    leftover: Iterable[Dict], repost_records: Dict[str, str], cutoff: datetime, rejected: Set[str]
+) -> List[List[str]]:
+    # [uri, cid, author_key, created, bron] — promo refresh niet, die komt elke run opnieuw langs
+    by_source: Dict[str, List[Dict]] = {}
+    seen: Set[str] = set()
+    for c in leftover:
+        if c.get("force_refresh") or c["uri"] in repost_records or c["uri"] in rejected or c["uri"] in seen:
             continue
-
-        created = parse_time(post)
-        if not created or created < cutoff:
+        if c["created"] < cutoff:
             continue
-
-        cands.append({
-            "uri": uri,
-            "cid": cid,
-            "created": created,
-            "author_key": ad or ah or uri,
-            "force_refresh": False,
-        })
-
-    cands.sort(key=lambda x: x["created"])
-    return cands
+        seen.add(c["uri"])
+        by_source.setdefault(c.get("source", "carry"), []).append(c)
+    # beurtelings per bron, nieuwste eerst: bij de cap vallen per bron de oudste af
+    queues = [sorted(cs, key=lambda x: x["created"], reverse=True) for cs in by_source.values()]
+    out: List[List[str]] = []
+    for i in range(max((len(q) for q in queues), default=0)):
+        for q in queues:
+            if i < len(q) and len(out) < CARRY_MAX_ITEMS:
+                c = q[i]
+                out.append([c["uri"], c["cid"], c["author_key"], c["created"].isoformat(), c.get("source", "carry")])
+    return out
 
 
 def force_unrepost_unlike_if_needed(
@@ -460,139 +1416,656 @@ def repost_and_like(
     return True
 
 
-def main():
-    log("=== BLEUSKYPROMO BOT START ===")
-
-    username = os.getenv(ENV_USERNAME, "").strip()
-    password = os.getenv(ENV_PASSWORD, "").strip()
-    if not username or not password:
-        log(f"❌ Missing env {ENV_USERNAME} / {ENV_PASSWORD}")
+def prefetch_links(client: Client, cache: Dict[str, List], configs: List[Tuple[Dict[str, Dict], Any]]) -> None:
+    """
+    Alle geconfigureerde links in één keer: verlopen/oude entries eruit,
+    missers parallel normaliseren. cache = {link: [at_uri, resolved_ts]}.
+    """
+    now_ts = int(time.time())
+    wanted: Dict[str, Any] = {}
+    for config, normalize in configs:
+        for obj in config.values():
+            link = (obj.get("link") or "").strip()
+            if link:
+                wanted[link] = normalize
+    for link in [k for k, (_, ts) in cache.items() if k not in wanted or now_ts - ts >= LINK_CACHE_TTL_HOURS * 3600]:
+        del cache[link]
+    misses = [link for link in wanted if link not in cache]
+    if not misses:
         return
-
-    cutoff = utcnow() - timedelta(hours=HOURS_BACK)
-
-    state = load_state(STATE_FILE)
-    repost_records: Dict[str, str] = state.get("repost_records", {})
-    like_records: Dict[str, str] = state.get("like_records", {})
-
-    client = Client()
-    client.login(username, password)
-    me = client.me.did
-    log(f"✅ Logged in as {me}")
-
-    # normalize feeds
-    feed_uris: List[Tuple[str, str, str]] = []
-    for key, obj in FEEDS.items():
-        link = (obj.get("link") or "").strip()
-        note = (obj.get("note") or "").strip()
-        if not link:
-            continue
-        uri = normalize_feed_uri(client, link)
+    log(f"🔗 Links resolven: {len(misses)} (cache: {len(cache)})")
+    with ThreadPoolExecutor(max_workers=max(min(AUTHOR_FEED_WORKERS, len(misses)), 1)) as pool:
+        uris = list(pool.map(lambda link: wanted[link](client, link), misses))
+    for link, uri in zip(misses, uris):
         if uri:
-            feed_uris.append((key, note, uri))
-        else:
-            log(f"⚠️ Feed ongeldig (skip): {key} -> {link}")
+            cache[link] = [uri, now_ts]
 
-    # normalize lists
-    list_uris: List[Tuple[str, str, str]] = []
-    for key, obj in LIJSTEN.items():
-        link = (obj.get("link") or "").strip()
-        note = (obj.get("note") or "").strip()
-        if not link:
-            continue
-        uri = normalize_list_uri(client, link)
-        if uri:
-            list_uris.append((key, note, uri))
-        else:
-            log(f"⚠️ Lijst ongeldig (skip): {key} -> {link}")
 
-    # normalize exclude
-    excl_uris: List[Tuple[str, str, str]] = []
-    for key, obj in EXCLUDE_LISTS.items():
+def normalize_links(
+    client: Client, config: Dict[str, Dict], normalize, label: str, cache: Optional[Dict[str, List]] = None
+) -> List[Tuple[str, str, str]]:
+    out: List[Tuple[str, str, str]] = []
+    for key, obj in config.items():
         link = (obj.get("link") or "").strip()
         note = (obj.get("note") or "").strip()
         if not link:
             continue
-        uri = normalize_list_uri(client, link)
+        cached = (cache or {}).get(link)
+        uri = cached[0] if cached else normalize(client, link)
         if uri:
-            excl_uris.append((key, note, uri))
+            out.append((key, note, uri))
         else:
-            log(f"⚠️ Exclude lijst ongeldig (skip): {key} -> {link}")
+            log(f"⚠️ {label} ongeldig (skip): {key} -> {link}")
+    return out
 
-    # build exclude sets
+
+def load_exclude_sets(
+    client: Client,
+    excl_uris: List[Tuple[str, str, str]],
+    member_cache: Dict[str, Dict],
+) -> Tuple[Set[str], Set[str]]:
     exclude_handles: Set[str] = set()
     exclude_dids: Set[str] = set()
     for key, note, luri in excl_uris:
         log(f"🚫 Loading exclude list: {key} ({note})")
-        members = fetch_list_members(client, luri, limit=max(1000, LIST_MEMBER_LIMIT))
+        members = get_list_members_cached(
+            client, member_cache, luri, limit=max(1000, LIST_MEMBER_LIMIT), ttl_minutes=EXCLUDE_CACHE_TTL_MINUTES
+        )
         log(f"🚫 Exclude members: {len(members)}")
         for h, d in members:
             if h:
                 exclude_handles.add(h.lower())
             if d:
                 exclude_dids.add(d.lower())
+    return exclude_handles, exclude_dids
 
-    # promo sort
-    def promo_sort(item: Tuple[str, str, str], promo_key: str) -> int:
-        return 0 if item[0] == promo_key else 1
-
-    feed_uris.sort(key=lambda x: promo_sort(x, PROMO_FEED_KEY))
-    list_uris.sort(key=lambda x: promo_sort(x, PROMO_LIST_KEY))
-
-    all_candidates: List[Dict] = []
 
-    # feeds
-    log(f"Feeds to process: {len(feed_uris)}")
-    for key, note, furi in feed_uris:
-        is_promo = (key == PROMO_FEED_KEY)
-        log(f"📥 Feed: {key} ({note})" + (" [PROMO]" if is_promo else ""))
-        items = fetch_feed_items(client, furi, max_items=FEED_MAX_ITEMS)
-        all_candidates.extend(
-            build_candidates_from_feed_items(items, cutoff, exclude_handles, exclude_dids, force_refresh=is_promo)
-        )
-
-    # lists
-    log(f"Lists to process: {len(list_uris)}")
+def build_member_registry(
+    client: Client,
+    list_uris: List[Tuple[str, str, str]],
+    member_cache: Dict[str, Dict],
+    exclude_handles: Set[str],
+    exclude_dids: Set[str],
+) -> Dict[str, List[str]]:
+    """
+    Unie van alle bronlijsten: actor (did, anders handle) -> lijst keys waar hij in staat.
+    Excluded leden vallen er vóór het ophalen al uit.
+    """
+    registry: Dict[str, List[str]] = {}
+    dropped = 0
     for key, note, luri in list_uris:
-        is_promo = (key == PROMO_LIST_KEY)
-        log(f"📋 List: {key} ({note})" + (" [PROMO]" if is_promo else ""))
-        members = fetch_list_members(client, luri, limit=max(1000, LIST_MEMBER_LIMIT))
-        log(f"👥 Members fetched: {len(members)}")
-        for (h, d) in members:
+        for h, d in get_list_members_cached(client, member_cache, luri, limit=max(1000, LIST_MEMBER_LIMIT)):
+            if (d and d.lower() in exclude_dids) or (h and h.lower() in exclude_handles):
+                dropped += 1
+                continue
             actor = d or h
             if not actor:
                 continue
-            author_items = fetch_author_feed(client, actor, AUTHOR_POSTS_PER_MEMBER)
-            all_candidates.extend(
-                build_candidates_from_feed_items(
-                    author_items, cutoff, exclude_handles, exclude_dids, force_refresh=is_promo
-                )
+            keys = registry.setdefault(actor, [])
+            if key not in keys:
+                keys.append(key)
+    shared = sum(1 for keys in registry.values() if len(keys) > 1)
+    log(f"👥 Member registry: {len(registry)} auteurs ({shared} in meerdere lijsten, {dropped} excluded)")
+    return registry
+
+
+def registry_owner(keys: List[str]) -> str:
+    # één lijst haalt de auteur op: promo als hij daarin staat, anders de eerste
+    return PROMO_LIST_KEY if PROMO_LIST_KEY in keys else keys[0]
+
+
+REPOST_COLLECTION = "app.bsky.feed.repost"
+LIKE_COLLECTION = "app.bsky.feed.like"
+
+
+def candidate_writes(me: str, c: Dict, repost_records: Dict[str, str], like_records: Dict[str, str]) -> List[Dict]:
+    """
+    applyWrites-operaties voor één kandidaat: (promo) deletes + repost/like create.
+    rkeys zijn lokaal gegenereerde TIDs, dus de record uri is vooraf bekend.
+    """
+    writes: List[Dict] = []
+    if c.get("force_refresh"):
+        for table, collection in ((repost_records, REPOST_COLLECTION), (like_records, LIKE_COLLECTION)):
+            parsed = parse_at_uri_rkey(table.get(c["uri"]) or "")
+            if parsed and parsed[0] == me and parsed[1] == collection:
+                writes.append({"$type": "com.atproto.repo.applyWrites#delete", "collection": collection, "rkey": parsed[2]})
+
+    created_at = utcnow().strftime("%Y-%m-%dT%H:%M:%SZ")
+    for collection in (REPOST_COLLECTION, LIKE_COLLECTION):
+        writes.append({
+            "$type": "com.atproto.repo.applyWrites#create",
+            "collection": collection,
+            "rkey": new_tid(),
+            "value": {
+                "$type": collection,
+                "subject": {"uri": c["uri"], "cid": c["cid"]},
+                "createdAt": created_at,
+            },
+        })
+    return writes
+
+
+def planned_records(me: str, writes: List[Dict]) -> Tuple[Optional[str], Optional[str]]:
+    # (repost uri, like uri) zoals ze na deze writes bestaan
+    out: Dict[str, Optional[str]] = {REPOST_COLLECTION: None, LIKE_COLLECTION: None}
+    for w in writes:
+        if w["$type"].endswith("#create"):
+            out[w["collection"]] = f"at://{me}/{w['collection']}/{w['rkey']}"
+    return out[REPOST_COLLECTION], out[LIKE_COLLECTION]
+
+
+def own_profile_reposts(client: Client, me: str, top: int) -> Set[str]:
+    # subjects van onze reposts bij de `top` nieuwste items op het eigen profiel
+    items = (fetch_author_feed(client, me, min(max(top, 1), 100)) or [])[:top]
+    return {it.uri for it in items if it.reason is not None}
+
+
+def promo_refresh_due(subject: str, repost_records: Dict[str, str], profile_top: Set[str], now_ts: int) -> bool:
+    """
+    Promo alleen opnieuw boosten als het nodig is: nog geen repost, laatste boost
+    (TID van ons repost record) ouder dan PROMO_REFRESH_MINUTES, of weggezakt op het profiel.
+    """
+    parsed = parse_at_uri_rkey(repost_records.get(subject) or "")
+    boosted = tid_timestamp(parsed[2]) if parsed else None
+    if boosted is None:
+        return True
+    if now_ts - boosted >= PROMO_REFRESH_MINUTES * 60:
+        return True
+    return subject not in profile_top
+
+
+WRITE_POINTS = {"create": 3, "update": 2, "delete": 1}
+
+
+def write_points(writes: List[Dict]) -> int:
+    return sum(WRITE_POINTS[w["$type"].rsplit("#", 1)[-1]] for w in writes)
+
+
+def unspent_points(
+    writes: List[Dict], before: Tuple[Optional[str], Optional[str]], after: Tuple[Optional[str], Optional[str]]
+) -> int:
+    """
+    Punten van de geplande writes die niet zijn uitgevoerd, afgeleid uit (repost, like) record
+    voor en na: een delete is gedaan als het oude record weg is, een create als er een nieuw staat.
+    """
+    index = {REPOST_COLLECTION: 0, LIKE_COLLECTION: 1}
+    undone: List[Dict] = []
+    for w in writes:
+        old, new = before[index[w["collection"]]], after[index[w["collection"]]]
+        done = new != old if w["$type"].endswith("#delete") else (new is not None and new != old)
+        if not done:
+            undone.append(w)
+    return write_points(undone)
+
+
+class WriteBudget:
+    """
+    Write-punten per minuut in state["write_points"] ({minuut_ts: punten}).
+    Rollend venster van een uur en een dag, zoals de PDS rekent.
+    """
+
+    def __init__(self, spent: Dict[str, int], hourly: int, daily: int):
+        self.spent = spent
+        self.hourly = hourly
+        self.daily = daily
+        self.planned = 0
+        self.deferred = 0
+        self.prune()
+
+    def prune(self, now_ts: Optional[int] = None) -> None:
+        now_ts = now_ts or int(time.time())
+        for k in [k for k in self.spent if now_ts - int(k) >= 86400]:
+            del self.spent[k]
+
+    def used(self, seconds: int, now_ts: Optional[int] = None) -> int:
+        now_ts = now_ts or int(time.time())
+        return sum(p for k, p in self.spent.items() if now_ts - int(k) < seconds)
+
+    def headroom(self) -> int:
+        return max(min(self.hourly - self.used(3600), self.daily - self.used(86400)), 0)
+
+    def try_spend(self, points: int) -> bool:
+        # vooraf boeken: wat niet past schuift door (carry-over) i.p.v. halverwege een 429
+        if points > self.headroom():
+            self.deferred += 1
+            return False
+        key = str(int(time.time()) // 60 * 60)
+        self.spent[key] = self.spent.get(key, 0) + points
+        self.planned += points
+        return True
+
+    def refund(self, points: int) -> None:
+        # geboekt maar niet geschreven (mislukt): teruggeven, nieuwste minuten eerst (daar is geboekt)
+        self.planned -= points
+        for key in sorted(self.spent, key=int, reverse=True):
+            if points <= 0:
+                break
+            take = min(points, self.spent[key])
+            self.spent[key] -= take
+            points -= take
+            if not self.spent[key]:
+                del self.spent[key]
+
+    def report(self) -> str:
+        return (
+            f"uur {self.used(3600)}/{self.hourly}, dag {self.used(86400)}/{self.daily}, "
+            f"headroom {self.headroom()}"
+        )
+
+
+def commit_writes(
+    me: str, batch: List[Tuple[Dict, List[Dict]]], repost_records: Dict[str, str], like_records: Dict[str, str]
+) -> None:
+    for c, ws in batch:
+        for w in ws:
+            table = repost_records if w["collection"] == REPOST_COLLECTION else like_records
+            if w["$type"].endswith("#delete"):
+                table.pop(c["uri"], None)
+            else:
+                table[c["uri"]] = f"at://{me}/{w['collection']}/{w['rkey']}"
+
+
+def apply_writes_atomic(
+    client: Client,
+    me: str,
+    batch: List[Tuple[Dict, List[Dict]]],
+    repost_records: Dict[str, str],
+    like_records: Dict[str, str],
+    journal: "ActionJournal",
+) -> str:
+    """
+    Eén applyWrites voor `batch`, met journal (plan -> uitkomsten -> afsluiten).
+    "ok" | "rejected" (4xx: niets geschreven) | "deferred" (429, of storing en batch staat er
+    niet) | "unknown" (niet vast te stellen: journal batch blijft open, volgende run verifieert).
+    """
+    writes = [w for _, ws in batch for w in ws]
+    # eerste geplande create = batch id (bestaat hij op de PDS, dan de hele batch)
+    batch_id = planned_records(me, batch[0][1])[0]
+    journal.plan(batch_id, [(c["uri"], *planned_records(me, ws)) for c, ws in batch])
+    try:
+        client.com.atproto.repo.apply_writes({"repo": me, "writes": writes})
+        outcome = "ok"
+    except Exception as e:
+        status = error_status(e)
+        if status == 429:
+            outcome = "deferred"
+        elif status is not None and status < 500:
+            outcome = "rejected"
+        else:
+            # timeout/5xx: de PDS kan de batch al gecommit hebben
+            exists = record_exists(client, batch_id)
+            outcome = {True: "ok", False: "deferred", None: "unknown"}[exists]
+        log(f"⚠️ applyWrites ({len(writes)} writes) mislukt: HTTP {status or 'error'} — {outcome}")
+    if outcome == "ok":
+        commit_writes(me, batch, repost_records, like_records)
+        for c, _ in batch:
+            journal.append(c["uri"], repost_records.get(c["uri"]), like_records.get(c["uri"]))
+    if outcome != "unknown":
+        journal.resolve(batch_id)
+    return outcome
+
+
+def apply_write_batch(
+    client: Client,
+    me: str,
+    batch: List[Tuple[Dict, List[Dict]]],
+    repost_records: Dict[str, str],
+    like_records: Dict[str, str],
+    journal: "ActionJournal",
+) -> List[Optional[bool]]:
+    """
+    Voert de writes van `batch` uit in één applyWrites (atomair) en werkt de records bij.
+    Alleen bij een harde 4xx per kandidaat opnieuw; bij 429/storing wordt niets meer
+    geprobeerd. Per kandidaat: True = geschreven, False = mislukt, None = niet uitgevoerd.
+    """
+    if APPLY_WRITES_BATCH <= 1:
+        results: List[Optional[bool]] = []
+        for c, _ in batch:
+            ok = repost_and_like(
+                client, me, c["uri"], c["cid"], repost_records, like_records, force_refresh=bool(c.get("force_refresh"))
             )
+            journal.append(c["uri"], repost_records.get(c["uri"]), like_records.get(c["uri"]))
+            results.append(ok)
+        return results
+
+    outcome = apply_writes_atomic(client, me, batch, repost_records, like_records, journal)
+    if outcome == "ok":
+        return [True] * len(batch)
+    if outcome != "rejected":
+        return [None] * len(batch)
+
+    # harde 4xx: per kandidaat (nog steeds atomair, zelfde rkeys) om de boosdoener te isoleren
+    results = []
+    for i, (c, ws) in enumerate(batch):
+        if len(batch) > 1:
+            outcome = apply_writes_atomic(client, me, [(c, ws)], repost_records, like_records, journal)
+        if outcome == "ok":
+            results.append(True)
+        elif outcome == "rejected":
+            # bijv. promo delete van een record dat al weg is: losse writes verdragen dat
+            ok = repost_and_like(
+                client, me, c["uri"], c["cid"], repost_records, like_records, force_refresh=bool(c.get("force_refresh"))
+            )
+            journal.append(c["uri"], repost_records.get(c["uri"]), like_records.get(c["uri"]))
+            results.append(ok)
+        else:
+            results.extend([None] * (len(batch) - i))
+            break
+    return results
 
-    # hashtag
-    log(f"🔎 Hashtag search: {HASHTAG_QUERY}")
-    hashtag_posts = fetch_hashtag_posts(client, HASHTAG_MAX_ITEMS)
-    log(f"Hashtag posts fetched: {len(hashtag_posts)}")
-    all_candidates.extend(
-        build_candidates_from_postviews(hashtag_posts, cutoff, exclude_handles, exclude_dids)
-    )
 
-    # dedupe + sort
-    seen: Set[str] = set()
-    candidates: List[Dict] = []
-    for c in sorted(all_candidates, key=lambda x: x["created"]):
-        if c["uri"] in seen:
+def reconcile_collection(
+    client: Client, me: str, collection: str, table: Dict[str, str], full: bool, cutoff_ts: int
+) -> Tuple[int, int, int]:
+    """
+    Leest onze eigen records (nieuwste eerst) en vult `table` (subject -> record uri) aan.
+    Incremental: stop bij het eerste record dat de state al kent. Geen writes.
+    Geeft (toegevoegd, verwijderd, pagina's).
+    """
+    added = removed = pages = 0
+    seen_subjects: Set[str] = set()
+    seen_records: Set[str] = set()
+    cursor = None
+    complete = False
+    while True:
+        out = xrpc_query(client, "com.atproto.repo.listRecords", {
+            "repo": me, "collection": collection, "limit": 100, "cursor": cursor,
+        })
+        pages += 1
+        records = out.get("records") or []
+        stop = False
+        for rec in records:
+            uri = rec.get("uri") or ""
+            parsed = parse_at_uri_rkey(uri)
+            subject = ((rec.get("value") or {}).get("subject") or {}).get("uri")
+            if not parsed or not subject:
+                continue
+            ts = tid_timestamp(parsed[2])
+            if ts is not None and ts < cutoff_ts:
+                stop = complete = True  # ouder dan de retention: valt bij prune er toch uit
+                break
+            seen_records.add(uri)
+            if table.get(subject) == uri:
+                if not full:
+                    stop = True
+                    break
+            elif subject not in seen_subjects:
+                # nieuwste record per subject wint; ontbrak of wees naar een verdwenen record
+                table[subject] = uri
+                added += 1
+            seen_subjects.add(subject)
+        cursor = out.get("cursor")
+        if stop or not cursor or not records:
+            complete = complete or not cursor or not records
+            break
+
+    if full and complete:
+        # entries binnen het gelezen bereik waarvan het record niet (meer) bestaat
+        for subject in list(table):
+            uri = table.get(subject)
+            parsed = parse_at_uri_rkey(uri or "")
+            ts = tid_timestamp(parsed[2]) if parsed else None
+            if uri not in seen_records and parsed and parsed[0] == me and parsed[1] == collection \
+                    and (ts is None or ts >= cutoff_ts):
+                del table[subject]
+                removed += 1
+    return added, removed, pages
+
+
+def reconcile_state(client: Client, me: str, repost_records: Dict[str, str], like_records: Dict[str, str]) -> None:
+    if RECONCILE not in ("incremental", "full"):
+        return
+    cutoff_ts = int(time.time()) - STATE_RETENTION_DAYS * 86400 if STATE_RETENTION_DAYS > 0 else 0
+    for collection, table in ((REPOST_COLLECTION, repost_records), (LIKE_COLLECTION, like_records)):
+        try:
+            added, removed, pages = reconcile_collection(
+                client, me, collection, table, RECONCILE == "full", cutoff_ts
+            )
+        except Exception as e:
+            log(f"⚠️ Reconcile {collection} mislukt: {e}")
             continue
-        seen.add(c["uri"])
-        candidates.append(c)
+        if added or removed or pages > 1:
+            log(f"🔁 Reconcile {collection}: +{added} / -{removed} ({pages} pagina's)")
 
-    log(f"🧩 Candidates total (deduped): {len(candidates)}")
+
+def main():
+    log("=== BLEUSKYPROMO BOT START ===")
+
+    username = os.getenv(ENV_USERNAME, "").strip()
+    password = os.getenv(ENV_PASSWORD, "").strip()
+    if not username or not password:
+        log(f"❌ Missing env {ENV_USERNAME} / {ENV_PASSWORD}")
+        return
+
+    cutoff = utcnow() - timedelta(hours=HOURS_BACK)
+    METRICS.reset()
+
+    state = load_state(STATE_DB)
+    replayed = replay_journal(JOURNAL_FILE, state)
+    if replayed:
+        log(f"📜 Journal replay: {replayed} acties hersteld")
+    repost_records: Dict[str, str] = state.get("repost_records", {})
+    like_records: Dict[str, str] = state.get("like_records", {})
+    member_cache: Dict[str, Dict] = state.setdefault("list_members", {})
+    activity: Dict[str, List] = state.setdefault("author_activity", {})
+
+    client = make_client()
+    with METRICS.phase("login"):
+        login_client(client, username, password, SESSION_FILE)
+    me = client.me.did
+    log(f"✅ Logged in as {me}")
+
+    with METRICS.phase("reconcile"):
+        confirm_journal_batches(client, state)
+        reconcile_state(client, me, repost_records, like_records)
+
+    link_cache: Dict[str, List] = state.setdefault("link_cache", {})
+    with METRICS.phase("links"):
+        prefetch_links(
+            client, link_cache,
+            [(FEEDS, normalize_feed_uri), (LIJSTEN, normalize_list_uri), (EXCLUDE_LISTS, normalize_list_uri)],
+        )
+        feed_uris = normalize_links(client, FEEDS, normalize_feed_uri, "Feed", link_cache)
+        list_uris = normalize_links(client, LIJSTEN, normalize_list_uri, "Lijst", link_cache)
+        excl_uris = normalize_links(client, EXCLUDE_LISTS, normalize_list_uri, "Exclude lijst", link_cache)
+    with METRICS.phase("exclude"):
+        exclude_handles, exclude_dids = load_exclude_sets(client, excl_uris, member_cache)
+
+    registry_lock = threading.Lock()
+    registry_box: List[Dict[str, List[str]]] = []
+
+    def member_registry() -> Dict[str, List[str]]:
+        # lui en één keer: in feed-modus alleen nodig als een list feed faalt
+        with registry_lock:
+            if not registry_box:
+                with METRICS.phase("member_registry"):
+                    registry_box.append(
+                        build_member_registry(client, list_uris, member_cache, exclude_handles, exclude_dids)
+                    )
+                # poll-schema alleen voor huidige leden; wie uit alle lijsten is, vervalt
+                gone = [a for a in activity if a not in registry_box[0]]
+                for a in gone:
+                    del activity[a]
+                if gone:
+                    log(f"🧹 Author activity: {len(gone)} oud-leden verwijderd")
+            return registry_box[0]
+
+    # Elke bron levert gesorteerde candidate streams; selectie loopt per tier (zie merge_candidates).
+    def feed_source(key: str, note: str, furi: str) -> List[List[Dict]]:
+        is_promo = (key == PROMO_FEED_KEY)
+        log(f"📥 Feed: {key} ({note})" + (" [PROMO]" if is_promo else ""))
+        with METRICS.phase("feeds"):
+            items = fetch_feed_items(
+                client, furi, max_items=FEED_MAX_ITEMS, cutoff=cutoff, stale_pages=feed_stale_pages(FEEDS.get(key, {}))
+            )
+        cands = sorted_candidates(items, cutoff, exclude_handles, exclude_dids, force_refresh=is_promo)
+        return tag_source([cands], key)
+
+    def list_source(key: str, note: str, luri: str) -> List[List[Dict]]:
+        is_promo = (key == PROMO_LIST_KEY)
+        log(f"📋 List: {key} ({note})" + (" [PROMO]" if is_promo else ""))
+        if LIST_SOURCE == "feed":
+            try:
+                with METRICS.phase("list_feeds"):
+                    items = fetch_list_feed_items(client, luri, cutoff, LIST_FEED_MAX_ITEMS)
+                log(f"📰 List feed items: {len(items)}")
+                cands = sorted_candidates(items, cutoff, exclude_handles, exclude_dids, force_refresh=is_promo)
+                return tag_source([cands], key)
+            except Exception as e:
+                log(f"⚠️ List feed mislukt ({e}) — fallback naar members")
+        # members-pad: elke auteur één keer per run, bij de lijst die hem "bezit"
+        reg = member_registry()
+        actors = [
+            a for a, keys in reg.items()
+            if key in keys and (LIST_SOURCE != "members" or registry_owner(keys) == key)
+        ]
+        log(f"👥 Members to fetch: {len(actors)}")
+        now_ts = int(utcnow().timestamp())
+        if ACTIVITY_SCHEDULE:
+            actors = [a for a in actors if author_is_due(activity.get(a), now_ts)]
+            log(f"⏱️ Members due for polling: {len(actors)}")
+        with METRICS.phase("author_feeds"):
+            feeds = fetch_author_feeds(client, actors, AUTHOR_POSTS_PER_MEMBER, AUTHOR_FEED_WORKERS)
+        failed = sum(1 for f in feeds if f is None)
+        if failed:
+            log(f"⚠️ Author feeds mislukt: {failed} (poll-schema ongewijzigd)")
+        out: List[List[Dict]] = []
+        for actor, author_items in zip(actors, feeds):
+            if author_items is None:
+                # fout is geen stilte: geen backoff, volgende run gewoon opnieuw
+                continue
+            if ACTIVITY_SCHEDULE:
+                activity[actor] = update_author_activity(activity.get(actor), author_items, now_ts)
+            promo_author = PROMO_LIST_KEY in reg[actor]
+            out.append(sorted_candidates(author_items, cutoff, exclude_handles, exclude_dids, force_refresh=promo_author))
+        return tag_source(out, key)
+
+    budget = WriteBudget(state.setdefault("write_points", {}), WRITE_BUDGET_HOURLY, WRITE_BUDGET_DAILY)
+    # normale repost = 2 creates; promo refresh komt daar nog 2 deletes bij
+    normal_cost = 2 * WRITE_POINTS["create"]
+    log(f"💰 Write budget: {budget.report()} (~{budget.headroom() // normal_cost} reposts)")
+
+    carry_cutoff = utcnow() - timedelta(hours=CARRY_MAX_AGE_HOURS)
+    carry_queue: List[List[str]] = state.get("carry_queue", [])
+
+    def carry_source() -> List[List[Dict]]:
+        # vorige run bleef dit liggen: alleen nog checken of de post bestaat, geen crawl
+        log(f"📦 Carry-over queue: {len(carry_queue)}")
+        with METRICS.phase("carry_over"):
+            posts = fetch_posts(client, [e[0] for e in carry_queue], AUTHOR_FEED_WORKERS)
+        cands = sorted_candidates(posts, carry_cutoff, exclude_handles, exclude_dids, force_refresh=False)
+        origin = {e[0]: e[4] for e in carry_queue if len(e) > 4}
+        for c in cands:
+            c["source"] = origin.get(c["uri"], "carry")
+        return [cands]
+
+    since_marks: Dict[str, str] = state.setdefault("hashtag_since", {})
+    # query -> (posts, compleet, kandidaten); marks pas na de selectie bijwerken
+    hashtag_runs: Dict[str, Tuple[List[PostRecord], bool, List[Dict]]] = {}
+
+    def hashtag_source() -> List[List[Dict]]:
+        log(f"🔎 Hashtag search: {', '.join(HASHTAG_QUERIES)}")
+        with METRICS.phase("hashtag"):
+            results = fetch_hashtag_searches(client, HASHTAG_QUERIES, cutoff, since_marks, HASHTAG_MAX_PAGES)
+        out: List[List[Dict]] = []
+        for query, (hashtag_posts, complete) in zip(HASHTAG_QUERIES, results):
+            log(f"Hashtag posts fetched ({query}): {len(hashtag_posts)}")
+            cands = sorted_candidates(hashtag_posts, cutoff, exclude_handles, exclude_dids, force_refresh=False)
+            hashtag_runs[query] = (hashtag_posts, complete, cands)
+            out.append(tag_source([cands], query)[0])
+        return out
+
+    log(f"Feeds to process: {len(feed_uris)}")
+    log(f"Lists to process: {len(list_uris)}")
+    promo_feeds = [f for f in feed_uris if f[0] == PROMO_FEED_KEY]
+    promo_lists = [x for x in list_uris if x[0] == PROMO_LIST_KEY]
+    profile_top: Set[str] = set()
+    if promo_feeds or promo_lists:
+        with METRICS.phase("promo_profile"):
+            profile_top = own_profile_reposts(client, me, PROMO_PROFILE_TOP)
+    promo_skipped = 0
+    now_ts = int(utcnow().timestamp())
+
+    # promo eerst; de rest gaat zoals vroeger oudste-eerst over alle bronnen heen
+    tiers = [
+        [lambda f=f: feed_source(*f) for f in promo_feeds]
+        + [lambda x=x: list_source(*x) for x in promo_lists],
+        ([carry_source] if carry_queue else [])
+        + [lambda f=f: feed_source(*f) for f in feed_uris if f not in promo_feeds]
+        + [lambda x=x: list_source(*x) for x in list_uris if x not in promo_lists]
+        + [hashtag_source],
+    ]
 
     total_done = 0
     per_user_count: Dict[str, int] = {}
+    journal = ActionJournal(JOURNAL_FILE, JOURNAL_FSYNC_EVERY)
+    pending: List[Tuple[Dict, List[Dict]]] = []
+    promo_pending: List[Tuple[Dict, List[Dict]]] = []  # promo pas aan het eind: bovenaan het profiel
+    batch_limit = max(APPLY_WRITES_BATCH, 1)
+    leftover: List[Dict] = []
+    rejected: Set[str] = set()  # geweigerde writes: niet meenemen naar de carry-over
+    writes_stopped = False  # na een 429/storing: rest van de run naar de carry-over
+
+    def flush_pending() -> None:
+        nonlocal total_done, writes_stopped
+        if not pending:
+            return
+        before = [(repost_records.get(c["uri"]), like_records.get(c["uri"])) for c, _ in pending]
+        if writes_stopped:
+            results: List[Optional[bool]] = [None] * len(pending)
+        else:
+            with METRICS.phase("writes"):
+                results = apply_write_batch(client, me, pending, repost_records, like_records, journal)
+        for (c, writes), ok, prev in zip(pending, results, before):
+            # alleen de punten van writes die niet gebeurd zijn teruggeven (fallback kan al deletes gedaan hebben)
+            budget.refund(unspent_points(writes, prev, (repost_records.get(c["uri"]), like_records.get(c["uri"]))))
+            if ok:
+                log(f"✅ Repost+Like: {c['uri']}")
+                continue
+            # mislukt/niet uitgevoerd: plek vrijgeven
+            total_done -= 1
+            if not c.get("force_refresh"):
+                per_user_count[c["author_key"]] -= 1
+            if ok is None:
+                # 429/PDS storing: niet verder hameren, deze run schrijft niets meer -> carry-over
+                writes_stopped = True
+                leftover.append(c)
+            else:
+                rejected.add(c["uri"])
+        pending.clear()
+
+    if PIPELINE == "stream":
+        # bronnen crawlen parallel; de writer begint zodra de promo-tier klaar is
+        pool = ThreadPoolExecutor(max_workers=max(SOURCE_WORKERS, 1))
+        futures = [[pool.submit(fn) for fn in tier] for tier in tiers]
+
+        def ranked_streams() -> Iterator[List[List[Dict]]]:
+            for tier in futures:
+                if not all(f.done() for f in tier):
+                    flush_pending()  # niet met een halve batch op de volgende tier wachten
+                yield [st for f in tier for st in f.result()]
+    else:
+        pool = None
+        crawled = [[st for fn in tier for st in fn()] for tier in tiers]
+        log(f"🧩 Candidates (voor dedupe): {sum(len(st) for streams in crawled for st in streams)}")
+
+        def ranked_streams() -> Iterator[List[List[Dict]]]:
+            return iter(crawled)
+
+    reached: List[List[List[Dict]]] = []  # tiers waar de selectie aan toe kwam
+
+    def reached_streams() -> Iterator[List[List[Dict]]]:
+        for streams in ranked_streams():
+            reached.append(streams)
+            yield streams
+
+    candidates = merge_candidates(reached_streams())
 
     for c in candidates:
         if total_done >= MAX_PER_RUN:
+            flush_pending()
+        if writes_stopped or total_done >= MAX_PER_RUN:
+            leftover.append(c)
             break
 
         ak = c["author_key"]
@@ -600,28 +2073,383 @@ def main():
 
         # per-user limit geldt voor normale posts; promo refresh mag altijd
         if per_user_count[ak] >= MAX_PER_USER and not c.get("force_refresh"):
+            METRICS.count("skip_per_user")
+            leftover.append(c)
+            continue
+
+        if not c.get("force_refresh") and c["uri"] in repost_records:
+            METRICS.count("skip_already_reposted")
+            continue
+        if c.get("force_refresh") and not promo_refresh_due(c["uri"], repost_records, profile_top, now_ts):
+            METRICS.count("skip_promo_fresh")
+            promo_skipped += 1
             continue
 
-        ok = repost_and_like(
-            client, me, c["uri"], c["cid"], repost_records, like_records, force_refresh=bool(c.get("force_refresh"))
+        writes = candidate_writes(me, c, repost_records, like_records)
+        # bronnen staan in prioriteitsvolgorde, dus promo krijgt het budget het eerst
+        if not budget.try_spend(write_points(writes)):
+            METRICS.count("skip_budget")
+            leftover.append(c)
+            continue
+        total_done += 1
+        if c.get("force_refresh"):
+            promo_pending.append((c, writes))
+            continue
+        if pending and sum(len(ws) for _, ws in pending) + len(writes) > batch_limit:
+            flush_pending()
+        pending.append((c, writes))
+        per_user_count[ak] += 1
+
+    flush_pending()
+    # promo als laatste schrijven, zodat hij na de run bovenaan ons profiel staat (zie PROMO_PROFILE_TOP)
+    for c, writes in promo_pending:
+        if pending and sum(len(ws) for _, ws in pending) + len(writes) > batch_limit:
+            flush_pending()
+        pending.append((c, writes))
+    flush_pending()
+    if pool is not None:
+        pool.shutdown(wait=True)  # alle bronnen afmaken, zoals batch (marks/activiteit/carry gelijk)
+
+    # wat de selectie al in handen had maar niet aan de beurt kwam -> queue voor de volgende run;
+    # tiers waar de selectie niet aan toe kwam niet leeg trekken (die komen volgende run opnieuw langs)
+    leftover.extend(c for streams in reached for st in streams for c in st)
+    state["carry_queue"] = carry_entries(leftover, repost_records, carry_cutoff, rejected)
+    log(f"📦 Carry-over naar volgende run: {len(state['carry_queue'])}")
+    carried = {e[0] for e in state["carry_queue"]}
+    for query, (hashtag_posts, complete, cands) in hashtag_runs.items():
+        mark = hashtag_mark(
+            since_marks.get(query), hashtag_posts, complete, cands, lambda u: u in repost_records or u in carried
         )
-        if ok:
-            total_done += 1
-            if not c.get("force_refresh"):
-                per_user_count[ak] += 1
-            log(f"✅ Repost+Like: {c['uri']}")
-            time.sleep(SLEEP_SECONDS)
+        if mark:
+            since_marks[query] = mark
+    if promo_skipped:
+        log(f"📌 Promo refresh overgeslagen (recent geboost, nog zichtbaar): {promo_skipped}")
+    log(f"💰 Write budget: {budget.planned} punten gepland, {budget.deferred} uitgesteld — {budget.report()}")
 
     state["repost_records"] = repost_records
     state["like_records"] = like_records
-    save_state(STATE_FILE, state)
+    journal.close()
+    with METRICS.phase("state_save"):
+        save_state(STATE_DB, state)
+    os.remove(JOURNAL_FILE)
     log(f"🔥 Done — total reposts this run: {total_done}")
+    METRICS.write(
+        METRICS_FILE, mode="poll", pipeline=PIPELINE, reposts=total_done,
+        carry_over=len(state["carry_queue"]), write_points=budget.planned,
+    )
+
+
+# ============================================================
+# STREAM MODE (Jetstream)
+# ============================================================
+POST_COLLECTION = "app.bsky.feed.post"
+HASHTAG_TAGS = {q[1:].lower() for q in HASHTAG_QUERIES if q.startswith("#") and " " not in q}
+HASHTAG_TEXT_RE = re.compile(
+    r"(?<!\w)#(" + "|".join(re.escape(t) for t in sorted(HASHTAG_TAGS)) + r")\b", re.I
+) if HASHTAG_TAGS else None
+
+
+def record_has_hashtag(record: Dict) -> bool:
+    if not HASHTAG_TAGS:
+        return False
+    for facet in record.get("facets") or []:
+        for feature in facet.get("features") or []:
+            if feature.get("$type") == "app.bsky.richtext.facet#tag" and (feature.get("tag") or "").lower() in HASHTAG_TAGS:
+                return True
+    return bool(HASHTAG_TEXT_RE.search(record.get("text") or ""))
+
+
+def candidate_from_event(event: Dict, cutoff: datetime, exclude_dids: Set[str]) -> Optional[Dict]:
+    commit = event.get("commit") or {}
+    if event.get("kind") != "commit" or commit.get("operation") != "create":
+        return None
+    if commit.get("collection") != POST_COLLECTION:
+        return None
+
+    did = (event.get("did") or "").lower()
+    rkey = commit.get("rkey")
+    if not did or not rkey:
+        return None
+
+    # zelfde filter als de poll mode
+    record = commit.get("record") or {}
+    post = PostRecord({
+        "uri": f"at://{did}/{POST_COLLECTION}/{rkey}",
+        "cid": commit.get("cid"),
+        "author": {"did": did},
+        "record": record,
+    })
+    c = next(iter_candidates([post], cutoff, set(), exclude_dids, force_refresh=False), None)
+    if c:
+        c["record"] = record
+    return c
+
+
+class StreamFilter:
+    """
+    wantedDids voor Jetstream (None = alles). `update` na een ledenrefresh; de open
+    verbinding krijgt dan een nieuwe options_update, en de lokale check volgt direct.
+    """
+
+    def __init__(self, dids: Optional[Iterable[str]]):
+        self.dids: Optional[Set[str]] = set(dids) if dids is not None else None
+        self.version = 0
+
+    def update(self, dids: Optional[Iterable[str]]) -> None:
+        new = set(dids) if dids is not None else None
+        if new != self.dids:
+            self.dids = new
+            self.version += 1
+
+    def wants(self, did: Optional[str]) -> bool:
+        return self.dids is None or did in self.dids
+
+
+def jetstream_events(wanted: StreamFilter, cursor: Optional[int]) -> Iterator[Optional[Dict]]:
+    """
+    Jetstream commit events voor app.bsky.feed.post, vanaf `cursor` (time_us).
+    Yieldt None als het STREAM_TICK_SECONDS stil is, zodat checkpoints/refreshes doorlopen.
+    Met JETSTREAM_REPLAY_FILE komen de events uit een opgenomen JSONL bestand.
+    """
+    if JETSTREAM_REPLAY_FILE:
+        with open(JETSTREAM_REPLAY_FILE, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    continue
+                if cursor and (event.get("time_us") or 0) <= cursor:
+                    continue
+                if not wanted.wants(event.get("did")):
+                    continue
+                yield event
+        return
+
+    from websockets.sync.client import connect
+
+    def options_update() -> str:
+        # wantedDids via options_update: past niet in een URL bij duizenden leden
+        return json.dumps({
+            "type": "options_update",
+            "payload": {"wantedCollections": [POST_COLLECTION], "wantedDids": sorted(wanted.dids or [])},
+        })
+
+    backoff = 1.0
+    while True:
+        params = [("wantedCollections", POST_COLLECTION), ("requireHello", "true")]
+        if cursor:
+            # paar seconden overlap; dubbele events vallen weg op repost_records
+            params.append(("cursor", str(cursor - 5_000_000)))
+        try:
+            with connect(f"{JETSTREAM_URL}?{urlencode(params)}", max_size=None) as ws:
+                sent = wanted.version
+                ws.send(options_update())
+                backoff = 1.0
+                while True:
+                    if wanted.version != sent:
+                        sent = wanted.version
+                        ws.send(options_update())
+                    try:
+                        message = ws.recv(timeout=STREAM_TICK_SECONDS)
+                    except TimeoutError:
+                        yield None
+                        continue
+                    event = json.loads(message)
+                    cursor = event.get("time_us") or cursor
+                    if not wanted.wants(event.get("did")):
+                        continue  # nog onderweg van voor de laatste options_update
+                    yield event
+        except Exception as e:
+            log(f"⚠️ Jetstream verbinding weg ({e}) — reconnect over {backoff:.0f}s")
+            time.sleep(backoff)
+            backoff = min(backoff * 2, 60.0)
+
+
+def stream_main():
+    log("=== BLEUSKYPROMO BOT START (stream) ===")
+    METRICS.reset()
+
+    username = os.getenv(ENV_USERNAME, "").strip()
+    password = os.getenv(ENV_PASSWORD, "").strip()
+    if not username or not password:
+        log(f"❌ Missing env {ENV_USERNAME} / {ENV_PASSWORD}")
+        return
+
+    state = load_state(STATE_DB)
+    replayed = replay_journal(JOURNAL_FILE, state)
+    if replayed:
+        log(f"📜 Journal replay: {replayed} acties hersteld")
+    repost_records: Dict[str, str] = state.get("repost_records", {})
+    like_records: Dict[str, str] = state.get("like_records", {})
+    member_cache: Dict[str, Dict] = state.setdefault("list_members", {})
+
+    client = make_client()
+    login_client(client, username, password, SESSION_FILE)
+    me = client.me.did
+    log(f"✅ Logged in as {me}")
+
+    confirm_journal_batches(client, state)
+    reconcile_state(client, me, repost_records, like_records)
+
+    if any((obj.get("link") or "").strip() for obj in FEEDS.values()):
+        log("ℹ️ Feeds worden in stream mode niet gevolgd (alleen lijsten + hashtag)")
+
+    link_cache: Dict[str, List] = state.setdefault("link_cache", {})
+    prefetch_links(
+        client, link_cache,
+        [(FEEDS, normalize_feed_uri), (LIJSTEN, normalize_list_uri), (EXCLUDE_LISTS, normalize_list_uri)],
+    )
+    list_uris = normalize_links(client, LIJSTEN, normalize_list_uri, "Lijst", link_cache)
+    excl_uris = normalize_links(client, EXCLUDE_LISTS, normalize_list_uri, "Exclude lijst", link_cache)
+
+    def refresh_members() -> Tuple[Set[str], Dict[str, bool]]:
+        excl_handles, excl_dids = load_exclude_sets(client, excl_uris, member_cache)
+        registry = build_member_registry(client, list_uris, member_cache, excl_handles, excl_dids)
+        # did -> is_promo (Jetstream filtert op DID)
+        return excl_dids, {a: PROMO_LIST_KEY in keys for a, keys in registry.items() if a.startswith("did:")}
+
+    exclude_dids, members = refresh_members()
+    log(f"👥 Stream members: {len(members)}" + (f" + hashtags {', '.join(sorted(HASHTAG_TAGS))}" if HASHTAG_TAGS else ""))
+
+    # met hashtag moeten alle posts binnenkomen; anders alleen die van leden
+    wanted = StreamFilter(None if HASHTAG_TAGS else members)
+    cursor = state.get("jetstream_cursor")
+    journal = ActionJournal(JOURNAL_FILE, JOURNAL_FSYNC_EVERY)
+
+    window = timedelta(hours=HOURS_BACK).total_seconds()
+    per_user: Dict[str, deque] = {}
+    recent_actions: deque = deque()
+    started = time.monotonic()
+    last_checkpoint = started
+    last_refresh = started
+    last_exclude_refresh = started
+    exclude_every = max(EXCLUDE_CACHE_TTL_MINUTES, EXCLUDE_STREAM_MIN_MINUTES) * 60
+    total_done = 0
+    budget = WriteBudget(state.setdefault("write_points", {}), WRITE_BUDGET_HOURLY, WRITE_BUDGET_DAILY)
+    log(f"💰 Write budget: {budget.report()}")
+
+    # budget op: kandidaat wachten tot er weer ruimte is (oudste eerst); bewaard als carry_queue.
+    # Bij meer dan CARRY_MAX_ITEMS valt de oudste af.
+    deferred: deque = deque(maxlen=max(CARRY_MAX_ITEMS, 1))
+    if state.get("carry_queue"):
+        with METRICS.phase("carry_over"):
+            posts = fetch_posts(client, [e[0] for e in state["carry_queue"]], AUTHOR_FEED_WORKERS)
+        carry_cutoff = utcnow() - timedelta(hours=CARRY_MAX_AGE_HOURS)
+        deferred.extend(sorted_candidates(posts, carry_cutoff, set(), exclude_dids, force_refresh=False))
+        log(f"📦 Carry-over queue: {len(deferred)}")
+    last_retry = started
+
+    def write_candidate(c: Dict, now: float) -> Optional[bool]:
+        """True = geschreven, False = overgeslagen/mislukt, None = geen budget (later opnieuw)."""
+        nonlocal total_done
+        ak = c["author_key"]
+        is_promo = members.get(ak, False)
+
+        # quota's in geheugen: sliding window van HOURS_BACK per auteur, 1 uur globaal
+        while recent_actions and now - recent_actions[0] > 3600:
+            recent_actions.popleft()
+        if len(recent_actions) >= STREAM_MAX_PER_HOUR:
+            return False
+        stamps = per_user.setdefault(ak, deque())
+        while stamps and now - stamps[0] > window:
+            stamps.popleft()
+        if len(stamps) >= MAX_PER_USER and not is_promo:
+            return False
+        planned = candidate_writes(me, dict(c, force_refresh=is_promo), repost_records, like_records)
+        if not budget.try_spend(write_points(planned)):
+            return None
+
+        before = (repost_records.get(c["uri"]), like_records.get(c["uri"]))
+        ok = repost_and_like(client, me, c["uri"], c["cid"], repost_records, like_records, force_refresh=is_promo)
+        if ok or is_promo:
+            journal.append(c["uri"], repost_records.get(c["uri"]), like_records.get(c["uri"]))
+        budget.refund(unspent_points(planned, before, (repost_records.get(c["uri"]), like_records.get(c["uri"]))))
+        if ok:
+            total_done += 1
+            recent_actions.append(now)
+            if not is_promo:
+                stamps.append(now)
+            log(f"✅ Repost+Like: {c['uri']}")
+        return ok
+
+    def retry_deferred(now: float) -> None:
+        cutoff = utcnow() - timedelta(hours=CARRY_MAX_AGE_HOURS)
+        while deferred:
+            c = deferred[0]
+            if c["uri"] not in repost_records and c["created"] >= cutoff and write_candidate(c, now) is None:
+                return  # nog steeds geen budget
+            deferred.popleft()
+
+    retry_deferred(started)
+
+    def checkpoint() -> None:
+        nonlocal journal
+        state["jetstream_cursor"] = cursor
+        state["carry_queue"] = carry_entries(
+            deferred, repost_records, utcnow() - timedelta(hours=CARRY_MAX_AGE_HOURS), set()
+        )
+        journal.close()
+        with METRICS.phase("state_save"):
+            save_state(STATE_DB, state)
+        os.remove(JOURNAL_FILE)
+        journal = ActionJournal(JOURNAL_FILE, JOURNAL_FSYNC_EVERY)
+        # daemon: metrics bij elk checkpoint bijwerken (cumulatief sinds de start)
+        METRICS.write(METRICS_FILE, mode="stream", reposts=total_done, write_points=budget.planned)
+
+    for event in jetstream_events(wanted, cursor):
+        if event is not None:
+            cursor = event.get("time_us") or cursor
+        now = time.monotonic()
+        if STREAM_MAX_SECONDS and now - started >= STREAM_MAX_SECONDS:
+            break
+        if now - last_checkpoint >= STREAM_CHECKPOINT_SECONDS:
+            checkpoint()
+            last_checkpoint = now
+        if now - last_refresh >= LIST_CACHE_TTL_MINUTES * 60:
+            exclude_dids, members = refresh_members()
+            wanted.update(None if HASHTAG_TAGS else members)  # nieuwe leden direct in de stream
+            last_refresh = last_exclude_refresh = now
+        elif now - last_exclude_refresh >= exclude_every:
+            # alleen de exclude set; candidate_from_event filtert daar per event op
+            exclude_dids = load_exclude_sets(client, excl_uris, member_cache)[1]
+            last_exclude_refresh = now
+        if deferred and now - last_retry >= STREAM_TICK_SECONDS:
+            retry_deferred(now)
+            last_retry = now
+        if event is None:
+            continue  # stil: alleen checkpoint/refresh/retry
+
+        c = candidate_from_event(event, utcnow() - timedelta(hours=HOURS_BACK), exclude_dids)
+        if not c:
+            continue
+        ak = c["author_key"]
+        if ak not in members and not record_has_hashtag(c["record"]):
+            continue
+        if c["uri"] in repost_records:
+            continue
+        if deferred or write_candidate(c, now) is None:
+            # achter de wachtrij aansluiten, zodat oudere kandidaten eerst budget krijgen
+            METRICS.count("skip_budget")
+            deferred.append(c)
+
+    checkpoint()
+    journal.close()
+    os.remove(JOURNAL_FILE)
+    log(
+        f"💰 Write budget: {budget.planned} punten gebruikt, {budget.deferred}x uitgesteld, "
+        f"{len(deferred)} in de carry-over — {budget.report()}"
+    )
+    log(f"🔥 Stream gestopt — total reposts: {total_done}")
 
 
 if __name__ == "__main__":
+    print("=== BLEUSKYPROMO BOT STARTED ===", flush=True)
     try:
         print("=== ABOUT TO CALL MAIN ===", flush=True)
-        main()
+        if RUN_MODE == "stream":
+            stream_main()
+        else:
+            main()
     except Exception:
         import traceback
         print("=== FATAL ERROR ===", flush=True)
@@ -0,0 +1,145 @@
+"""
+End-to-end benchmark tegen scripts/fake_xrpc.py (alles lokaal, in één proces).
+
+Draait bot.main() (--runs keer, state blijft staan tussen runs) en daarna
+scripts/unrepost_all_nb.py, en rapporteert per stap: wall time, API calls per fase,
+429's en piek-geheugen (tracemalloc). Bot-output gaat naar <workdir>/bench.log.
+
+    python scripts/bench.py --authors 1000 --list-size 600 --latency-ms 30 --runs 2
+    python scripts/bench.py -e LIST_SOURCE=members -e READ_RATE=200 --json bench.json
+    python scripts/bench.py --list-size-override 3m6xfd6xs472o=20   # kleine exclude lijst
+
+Env van de bot (-e KEY=VAL) wordt gezet vóór `import bot`.
+"""
+import argparse
+import contextlib
+import importlib.util
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import Counter
+from typing import Callable, Dict
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+sys.path.insert(0, os.path.join(HERE, ".."))
+import fake_xrpc  # noqa: E402
+
+# nsid -> fase, voor het overzicht
+PHASES = {
+    "com.atproto.server.createSession": "login",
+    "com.atproto.server.refreshSession": "login",
+    "com.atproto.server.getSession": "login",
+    "app.bsky.actor.getProfile": "login",
+    "com.atproto.identity.resolveHandle": "links",
+    "app.bsky.graph.getList": "lijstleden",
+    "app.bsky.feed.getFeed": "feeds",
+    "app.bsky.feed.getListFeed": "list feeds",
+    "app.bsky.feed.getAuthorFeed": "author feeds",
+    "app.bsky.feed.searchPosts": "hashtag",
+    "app.bsky.feed.getPosts": "carry-over",
+    "com.atproto.repo.listRecords": "repo scan",
+    "com.atproto.repo.applyWrites": "writes",
+    "com.atproto.repo.createRecord": "writes",
+    "com.atproto.repo.deleteRecord": "writes",
+}
+
+
+def measure(app: fake_xrpc.FakeXrpc, fn: Callable[[], None], log_path: str) -> Dict:
+    app.reset_stats()
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    error = None
+    with open(log_path, "a", encoding="utf-8") as fh, contextlib.redirect_stdout(fh):
+        try:
+            fn()
+        except Exception as e:  # meten wat er tot dan toe gebeurde
+            error = f"{type(e).__name__}: {e}"
+    wall = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    stats = app.stats()
+    phases: Counter = Counter()
+    for nsid, n in stats["calls"].items():
+        phases[PHASES.get(nsid, nsid)] += n
+    return {
+        "wall_s": round(wall, 3),
+        "peak_mb": round(peak / 1e6, 2),
+        "calls": sum(stats["calls"].values()),
+        "calls_per_phase": dict(phases),
+        "calls_per_nsid": stats["calls"],
+        "throttled": sum(stats["throttled"].values()),
+        "bytes_out": stats["bytes_out"],
+        "error": error,
+    }
+
+
+def report(name: str, r: Dict) -> None:
+    print(f"⏱️ {name}: {r['wall_s']}s, {r['calls']} calls ({r['throttled']} x 429), "
+          f"{r['bytes_out'] / 1e6:.1f} MB, piek {r['peak_mb']} MB")
+    if r["error"]:
+        print(f"    ❌ {r['error']}")
+    for phase, n in sorted(r["calls_per_phase"].items(), key=lambda x: -x[1]):
+        print(f"    {phase:<14} {n}")
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    fake_xrpc.add_dataset_args(p)
+    p.add_argument("--runs", type=int, default=1, help="aantal bot runs na elkaar (warme state vanaf run 2)")
+    p.add_argument("--skip-unrepost", action="store_true")
+    p.add_argument("-e", "--env", action="append", default=[], help="KEY=VAL voor de bot")
+    p.add_argument("--workdir", help="default: tijdelijke map")
+    p.add_argument("--json", help="resultaten ook als JSON wegschrijven")
+    args = p.parse_args()
+
+    json_path = os.path.abspath(args.json) if args.json else None
+    app = fake_xrpc.app_from_args(args)
+    server = fake_xrpc.start_server(app)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    workdir = os.path.abspath(args.workdir or tempfile.mkdtemp(prefix="bench_"))
+    os.makedirs(workdir, exist_ok=True)
+    log_path = os.path.join(workdir, "bench.log")
+    print(f"🧪 {len(app.data.authors)} auteurs, {len(app.data.by_uri)} posts, {base_url}, workdir {workdir}")
+
+    os.environ.update({
+        "BSKY_BASE_URL": base_url,
+        "BSKY_USERNAME_BP": fake_xrpc.ME_HANDLE, "BSKY_PASSWORD_BP": "bench",
+        "BSKY_USERNAME_NB": fake_xrpc.ME_HANDLE, "BSKY_PASSWORD_NB": "bench",
+        "STATE_DB": os.path.join(workdir, "state.db"),
+        "STATE_DB_NB": os.path.join(workdir, "state.db"),  # nep-server: één account voor beide
+        "STATE_FILE": os.path.join(workdir, "geen_legacy_state.json"),
+        "SESSION_FILE": os.path.join(workdir, "session.json"),
+        "SESSION_FILE_NB": os.path.join(workdir, "session_nb.json"),
+    })
+    for kv in args.env:
+        k, _, v = kv.partition("=")
+        os.environ[k] = v
+    os.chdir(workdir)
+
+    import bot  # na de env, want bot leest config bij import
+
+    results: Dict[str, Dict] = {}
+    for i in range(1, args.runs + 1):
+        results[f"bot run {i}"] = measure(app, bot.main, log_path)
+        report(f"bot run {i}", results[f"bot run {i}"])
+
+    if not args.skip_unrepost:
+        spec = importlib.util.spec_from_file_location("unrepost_all_nb", os.path.join(HERE, "unrepost_all_nb.py"))
+        unrepost = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(unrepost)
+        results["unrepost"] = measure(app, unrepost.main, log_path)
+        report("unrepost", results["unrepost"])
+
+    server.shutdown()
+    if json_path:
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump({"dataset": vars(args), "results": results}, f, indent=2)
+        print(f"📝 {json_path}")
+
+
+if __name__ == "__main__":
+    main()
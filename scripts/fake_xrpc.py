@@ -0,0 +1,420 @@
+"""
+Lokale nep-XRPC server voor benchmarks en offline tests (geen netwerk, geen account).
+
+Synthetische dataset: N auteurs met posts over de laatste uren, deels met media,
+deels replies, deels met hashtag. Lijsten en feeds krijgen een vaste (seeded)
+steekproef van auteurs, dus dezelfde uri geeft elke run dezelfde leden.
+
+Starten:
+    python scripts/fake_xrpc.py --port 8787 --authors 500 --list-size 300 --latency-ms 40 --rate-429 0.01
+Bot ertegen draaien:
+    BSKY_BASE_URL=http://127.0.0.1:8787 BSKY_USERNAME_BP=me BSKY_PASSWORD_BP=x python bot.py
+"""
+import argparse
+import base64
+import hashlib
+import json
+import random
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+ME_DID = "did:plc:fakeme"
+ME_HANDLE = "me.fake.test"
+RATE_LIMIT = 3000
+RATE_WINDOW = 300
+TID_ALPHABET = "234567abcdefghijklmnopqrstuvwxyz"
+MEDIA_EMBED = {"$type": "app.bsky.embed.images", "images": [{"alt": "", "image": {"$type": "blob"}}]}
+
+
+def tid(us: int, clock_id: int = 0) -> str:
+    value = (us << 10) | clock_id
+    return "".join(TID_ALPHABET[(value >> (5 * i)) & 31] for i in range(12, -1, -1))
+
+
+def iso(ts: float) -> str:
+    return datetime.fromtimestamp(ts, timezone.utc).isoformat(timespec="milliseconds").replace("+00:00", "Z")
+
+
+def fake_jwt(sub: str, ttl: int) -> str:
+    enc = lambda d: base64.urlsafe_b64encode(json.dumps(d).encode()).decode().rstrip("=")  # noqa: E731
+    return f"{enc({'alg': 'none'})}.{enc({'exp': int(time.time()) + ttl, 'sub': sub})}.sig"
+
+
+def seeded(*parts: str) -> random.Random:
+    return random.Random(hashlib.sha256("|".join(parts).encode()).hexdigest())
+
+
+class Dataset:
+    """Posts (nieuwste eerst) per auteur + een in-memory repo voor onze eigen records."""
+
+    def __init__(
+        self,
+        authors: int = 300,
+        list_size: int = 200,
+        posts_per_hour: float = 0.5,
+        hours: int = 24,
+        media_ratio: float = 0.6,
+        reply_ratio: float = 0.2,
+        hashtag_ratio: float = 0.1,
+        hashtag: str = "bskypromo",
+        seed_reposts: int = 0,
+        seed: str = "bench",
+        list_sizes: Optional[Dict[str, int]] = None,
+    ):
+        self.list_size = list_size
+        self.list_sizes = list_sizes or {}
+        self.hashtag = hashtag.lstrip("#").lower()
+        self.seed = seed
+        now = time.time()
+        rnd = seeded(seed, "posts")
+        self.authors = [f"did:plc:fake{i:06d}" for i in range(authors)]
+        self.handles = {d: f"{d[8:]}.fake.test" for d in self.authors}
+        self.posts: Dict[str, List[Dict]] = {}
+        self.by_uri: Dict[str, Dict] = {}
+        for did in self.authors:
+            n = int(posts_per_hour * hours) + (1 if rnd.random() < (posts_per_hour * hours) % 1 else 0)
+            stamps = sorted((now - rnd.random() * hours * 3600 for _ in range(n)), reverse=True)
+            views = [self._post(did, ts, rnd, media_ratio, reply_ratio, hashtag_ratio) for ts in stamps]
+            self.posts[did] = views
+            for v in views:
+                self.by_uri[v["uri"]] = v
+        self.timeline = sorted(self.by_uri.values(), key=lambda v: v["indexedAt"], reverse=True)
+
+        self.lock = threading.Lock()
+        self.repo: Dict[str, Dict[str, Dict]] = {}
+        self.cids = 0
+        subjects = [v for v in self.timeline if v["record"].get("embed")][:seed_reposts]
+        for i, v in enumerate(subjects):
+            ts = now - 86400 * 30 + i
+            rkey = tid(int(ts * 1_000_000), 1)
+            self.put("app.bsky.feed.repost", rkey, {
+                "$type": "app.bsky.feed.repost",
+                "subject": {"uri": v["uri"], "cid": v["cid"]},
+                "createdAt": iso(ts),
+            })
+
+    def _post(self, did: str, ts: float, rnd: random.Random, media: float, reply: float, tag: float) -> Dict:
+        rkey = tid(int(ts * 1_000_000), rnd.randrange(1024))
+        uri = f"at://{did}/app.bsky.feed.post/{rkey}"
+        record: Dict = {"$type": "app.bsky.feed.post", "text": "synthetic post", "createdAt": iso(ts)}
+        if rnd.random() < tag:
+            record["text"] += f" #{self.hashtag}"
+        if rnd.random() < media:
+            record["embed"] = MEDIA_EMBED
+        if rnd.random() < reply:
+            parent = {"uri": uri, "cid": "bafyparent"}
+            record["reply"] = {"root": parent, "parent": parent}
+        return {
+            "uri": uri,
+            "cid": "bafy" + hashlib.sha1(uri.encode()).hexdigest()[:20],
+            "author": {"did": did, "handle": self.handles[did]},
+            "record": record,
+            "indexedAt": record["createdAt"],
+        }
+
+    def members(self, uri: str) -> List[str]:
+        # zelfde uri -> zelfde leden; verschillende lijsten overlappen deels
+        size = self.list_sizes.get(uri.rsplit("/", 1)[-1], self.list_size)
+        return seeded(self.seed, uri).sample(self.authors, min(size, len(self.authors)))
+
+    def merged(self, dids: List[str]) -> List[Dict]:
+        views = [v for d in dids for v in self.posts.get(d, [])]
+        return sorted(views, key=lambda v: v["indexedAt"], reverse=True)
+
+    def put(self, collection: str, rkey: str, value: Dict) -> Tuple[str, str]:
+        with self.lock:
+            self.repo.setdefault(collection, {})[rkey] = value
+            self.cids += 1
+            return f"at://{ME_DID}/{collection}/{rkey}", f"bafyrec{self.cids}"
+
+    def delete(self, collection: str, rkey: str) -> None:
+        with self.lock:
+            self.repo.get(collection, {}).pop(rkey, None)
+
+
+def page(items: List, params: Dict, default_limit: int = 50, max_limit: int = 100) -> Tuple[List, Optional[str]]:
+    start = int(params.get("cursor") or 0)
+    limit = min(int(params.get("limit") or default_limit), max_limit)
+    chunk = items[start:start + limit]
+    return chunk, (str(start + limit) if start + limit < len(items) else None)
+
+
+class FakeXrpc:
+    """Routes + fault injection (latency, 429) + tellers per nsid."""
+
+    def __init__(self, data: Dataset, latency_ms: float = 0.0, rate_429: float = 0.0, retry_after: float = 0.0):
+        self.data = data
+        self.latency_ms = latency_ms
+        self.rate_429 = rate_429
+        self.retry_after = retry_after
+        self.rnd = random.Random(data.seed)
+        self.stats_lock = threading.Lock()
+        self.calls: Counter = Counter()
+        self.throttled: Counter = Counter()
+        self.bytes_out = 0
+        self.window_start = time.time()
+        self.window_used = 0
+
+    def ratelimit_headers(self) -> Dict[str, str]:
+        # vast venster zoals de echte server: RATE_LIMIT requests per RATE_WINDOW seconden
+        with self.stats_lock:
+            now = time.time()
+            if now - self.window_start >= RATE_WINDOW:
+                self.window_start, self.window_used = now, 0
+            self.window_used += 1
+            remaining = max(RATE_LIMIT - self.window_used, 0)
+            reset = int(self.window_start + RATE_WINDOW)
+        return {"ratelimit-limit": str(RATE_LIMIT), "ratelimit-remaining": str(remaining), "ratelimit-reset": str(reset)}
+
+    def reset_stats(self) -> None:
+        with self.stats_lock:
+            self.calls.clear()
+            self.throttled.clear()
+            self.bytes_out = 0
+
+    def stats(self) -> Dict:
+        with self.stats_lock:
+            return {"calls": dict(self.calls), "throttled": dict(self.throttled), "bytes_out": self.bytes_out}
+
+    def handle(self, method: str, nsid: str, params: Dict, body: Dict) -> Tuple[int, Dict, Dict]:
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000 * (0.5 + self.rnd.random()))
+        with self.stats_lock:
+            self.calls[nsid] += 1
+            throttle = self.rate_429 and not nsid.startswith("com.atproto.server.") and self.rnd.random() < self.rate_429
+            if throttle:
+                self.throttled[nsid] += 1
+        headers = self.ratelimit_headers()
+        if throttle:
+            # losse 429 (bijv. een overbelaste AppView): retry-after, het venster zelf is niet op
+            headers["retry-after"] = str(self.retry_after)
+            return 429, headers, {"error": "RateLimitExceeded", "message": "fake 429"}
+        fn = getattr(self, "x_" + nsid.replace(".", "_"), None)
+        if fn is None:
+            return 501, headers, {"error": "MethodNotImplemented", "message": nsid}
+        return 200, headers, fn(params, body)
+
+    # --- server / identity ---
+    def _session(self) -> Dict:
+        return {
+            "did": ME_DID, "handle": ME_HANDLE,
+            "accessJwt": fake_jwt(ME_DID, 7200), "refreshJwt": fake_jwt(ME_DID, 86400 * 60),
+        }
+
+    def x_com_atproto_server_createSession(self, params, body):
+        return self._session()
+
+    def x_com_atproto_server_refreshSession(self, params, body):
+        return self._session()
+
+    def x_com_atproto_server_getSession(self, params, body):
+        return {"did": ME_DID, "handle": ME_HANDLE}
+
+    def x_app_bsky_actor_getProfile(self, params, body):
+        return {"did": ME_DID, "handle": ME_HANDLE}
+
+    def x_com_atproto_identity_resolveHandle(self, params, body):
+        handle = params.get("handle", "")
+        did = next((d for d, h in self.data.handles.items() if h == handle), ME_DID)
+        return {"did": did}
+
+    # --- reads ---
+    def x_app_bsky_feed_getFeed(self, params, body):
+        views, cursor = page(self.data.merged(self.data.members(params.get("feed", ""))), params)
+        return {"feed": [{"post": v} for v in views], "cursor": cursor}
+
+    def x_app_bsky_feed_getListFeed(self, params, body):
+        views, cursor = page(self.data.merged(self.data.members(params.get("list", ""))), params)
+        return {"feed": [{"post": v} for v in views], "cursor": cursor}
+
+    def x_app_bsky_graph_getList(self, params, body):
+        uri = params.get("list", "")
+        dids, cursor = page(self.data.members(uri), params)
+        return {
+            "list": {"uri": uri, "cid": "bafylist", "name": "fake", "purpose": "app.bsky.graph.defs#curatelist",
+                     "creator": {"did": ME_DID, "handle": ME_HANDLE}, "indexedAt": iso(time.time())},
+            "items": [{"uri": f"{uri}/item/{d[8:]}", "subject": {"did": d, "handle": self.data.handles[d]}}
+                      for d in dids],
+            "cursor": cursor,
+        }
+
+    def x_app_bsky_feed_getAuthorFeed(self, params, body):
+        actor = params.get("actor", "")
+        if actor == ME_DID:
+            views = self._own_reposts()
+        else:
+            did = actor if actor.startswith("did:") else next(
+                (d for d, h in self.data.handles.items() if h == actor), "")
+            views = [{"post": v} for v in self.data.posts.get(did, [])]
+        items, cursor = page(views, params)
+        return {"feed": items, "cursor": cursor}
+
+    def _own_reposts(self) -> List[Dict]:
+        with self.data.lock:
+            reposts = sorted(self.data.repo.get("app.bsky.feed.repost", {}).items(), reverse=True)
+        out = []
+        for _, value in reposts:
+            v = self.data.by_uri.get(value["subject"]["uri"])
+            if v:
+                out.append({"post": v, "reason": {"$type": "app.bsky.feed.defs#reasonRepost",
+                                                  "by": {"did": ME_DID, "handle": ME_HANDLE},
+                                                  "indexedAt": value["createdAt"]}})
+        return out
+
+    def x_app_bsky_feed_searchPosts(self, params, body):
+        tag = "#" + self.data.hashtag
+        since = params.get("since") or ""
+        hits = [v for v in self.data.timeline if tag in v["record"]["text"].lower() and v["indexedAt"] >= since]
+        views, cursor = page(hits, params, default_limit=25)
+        return {"posts": views, "cursor": cursor}
+
+    def x_app_bsky_feed_getPosts(self, params, body):
+        uris = params.get("uris") or []
+        return {"posts": [self.data.by_uri[u] for u in uris[:25] if u in self.data.by_uri]}
+
+    # --- repo ---
+    def x_com_atproto_repo_getRecord(self, params, body):
+        with self.data.lock:
+            value = self.data.repo.get(params.get("collection", ""), {}).get(params.get("rkey", ""))
+        if value is None:
+            raise LookupError("RecordNotFound")  # -> 400, zoals de PDS
+        return {"uri": f"at://{ME_DID}/{params['collection']}/{params['rkey']}", "cid": "bafyrec", "value": value}
+
+    def x_com_atproto_repo_listRecords(self, params, body):
+        with self.data.lock:
+            records = sorted(self.data.repo.get(params.get("collection", ""), {}).items(),
+                             reverse=str(params.get("reverse", "")).lower() != "true")
+        cursor = params.get("cursor")
+        if cursor:
+            newest_first = str(params.get("reverse", "")).lower() != "true"
+            records = [(k, v) for k, v in records if (k < cursor if newest_first else k > cursor)]
+        limit = min(int(params.get("limit") or 50), 100)
+        chunk = records[:limit]
+        return {
+            "records": [{"uri": f"at://{ME_DID}/{params['collection']}/{k}", "cid": "bafyrec", "value": v}
+                        for k, v in chunk],
+            "cursor": chunk[-1][0] if len(records) > limit else None,
+        }
+
+    def x_com_atproto_repo_createRecord(self, params, body):
+        rkey = body.get("rkey") or tid(time.time_ns() // 1000, 7)
+        uri, cid = self.data.put(body["collection"], rkey, body["record"])
+        return {"uri": uri, "cid": cid}
+
+    def x_com_atproto_repo_deleteRecord(self, params, body):
+        self.data.delete(body["collection"], body["rkey"])
+        return {}
+
+    def x_com_atproto_repo_applyWrites(self, params, body):
+        writes = body.get("writes") or []
+        if len(writes) > 200:
+            raise ValueError("too many writes")
+        results = []
+        for w in writes:
+            kind = w.get("$type", "").rsplit("#", 1)[-1]
+            if kind == "delete":
+                self.data.delete(w["collection"], w["rkey"])
+                results.append({"$type": "com.atproto.repo.applyWrites#deleteResult"})
+            else:
+                uri, cid = self.data.put(w["collection"], w.get("rkey") or tid(time.time_ns() // 1000, 7), w["value"])
+                results.append({"$type": "com.atproto.repo.applyWrites#createResult", "uri": uri, "cid": cid})
+        return {"results": results}
+
+
+def make_handler(app: FakeXrpc):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, zoals de echte PDS
+
+        def _serve(self, method: str) -> None:
+            url = urlparse(self.path)
+            nsid = url.path.rsplit("/", 1)[-1]
+            params = {k: (v if k == "uris" else v[0]) for k, v in parse_qs(url.query).items()}
+            length = int(self.headers.get("content-length") or 0)
+            raw = self.rfile.read(length) if length else b""
+            try:
+                body = json.loads(raw) if raw else {}
+                status, headers, payload = app.handle(method, nsid, params, body)
+            except Exception as e:
+                status, headers, payload = 400, {}, {"error": "InvalidRequest", "message": str(e)}
+            out = json.dumps(payload).encode()
+            with app.stats_lock:
+                app.bytes_out += len(out)
+            self.send_response(status)
+            self.send_header("content-type", "application/json")
+            self.send_header("content-length", str(len(out)))
+            for k, v in headers.items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(out)
+
+        def do_GET(self):
+            self._serve("GET")
+
+        def do_POST(self):
+            self._serve("POST")
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def start_server(app: FakeXrpc, host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer((host, port), make_handler(app))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def add_dataset_args(p: argparse.ArgumentParser) -> None:
+    p.add_argument("--authors", type=int, default=300)
+    p.add_argument("--list-size", type=int, default=200, help="leden per lijst/feed (seeded steekproef)")
+    p.add_argument("--list-size-override", action="append", default=[], metavar="RKEY=N",
+                   help="andere grootte voor één lijst/feed, bijv. een kleine exclude lijst")
+    p.add_argument("--posts-per-hour", type=float, default=0.5, help="per auteur")
+    p.add_argument("--hours", type=int, default=24)
+    p.add_argument("--media-ratio", type=float, default=0.6)
+    p.add_argument("--reply-ratio", type=float, default=0.2)
+    p.add_argument("--hashtag-ratio", type=float, default=0.1)
+    p.add_argument("--seed-reposts", type=int, default=0, help="bestaande repost records in onze repo")
+    p.add_argument("--latency-ms", type=float, default=0.0)
+    p.add_argument("--rate-429", type=float, default=0.0, help="kans op 429 per request")
+    p.add_argument("--retry-after", type=float, default=0.0)
+    p.add_argument("--seed", default="bench")
+
+
+def app_from_args(args: argparse.Namespace) -> FakeXrpc:
+    data = Dataset(
+        authors=args.authors, list_size=args.list_size, posts_per_hour=args.posts_per_hour, hours=args.hours,
+        media_ratio=args.media_ratio, reply_ratio=args.reply_ratio, hashtag_ratio=args.hashtag_ratio,
+        seed_reposts=args.seed_reposts, seed=args.seed,
+        list_sizes={k: int(v) for k, _, v in (o.partition("=") for o in args.list_size_override)},
+    )
+    return FakeXrpc(data, latency_ms=args.latency_ms, rate_429=args.rate_429, retry_after=args.retry_after)
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8787)
+    add_dataset_args(p)
+    args = p.parse_args()
+    app = app_from_args(args)
+    server = start_server(app, args.host, args.port)
+    print(f"🧪 Fake XRPC op http://{args.host}:{server.server_address[1]} — "
+          f"{len(app.data.authors)} auteurs, {len(app.data.by_uri)} posts")
+    try:
+        while True:
+            time.sleep(60)
+            print(f"📊 {app.stats()}")
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
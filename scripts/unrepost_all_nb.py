@@ -1,70 +1,198 @@
-from atproto import Client
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timezone
+import json
 import os
+import sys
 import time
 
-COLLECTION = "app.bsky.feed.repost"
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from bot import (  # noqa: E402
+    EXCLUDE_LISTS,
+    WRITE_BUDGET_DAILY,
+    WRITE_BUDGET_HOURLY,
+    StateDB,
+    WriteBudget,
+    load_exclude_sets,
+    login_client,
+    make_client,
+    normalize_links,
+    normalize_list_uri,
+    parse_iso,
+    tid_timestamp,
+    xrpc_query,
+)
+
+COLLECTIONS = {"repost": "app.bsky.feed.repost", "like": "app.bsky.feed.like"}
+STATE_TABLES = {"app.bsky.feed.repost": "repost_records", "app.bsky.feed.like": "like_records"}
 PAGE_LIMIT = 100
+SESSION_FILE = os.getenv("SESSION_FILE_NB", ".bsky_session_nb.json")
+# cursor + voortgang per collectie, zodat een onderbroken run verder gaat waar hij was
+PROGRESS_FILE = os.getenv("PROGRESS_FILE_NB", "unrepost_progress_nb.json")
+# State DB van een bot-run op dit (NB) account: verwijderde records gaan daar ook uit.
+# Niet gezet = geen state sync; de STATE_DB van bot.py hoort bij het BP account.
+STATE_DB_NB = os.getenv("STATE_DB_NB", "").strip() or None
+
+# Selectief opruimen (schema): CLEANUP_COLLECTIONS="repost,like", OLDER_THAN_DAYS=N,
+# CLEANUP_EXCLUDED=1 (subject van een auteur uit EXCLUDE_LISTS). Geen van beide = alles weg.
+CLEANUP_COLLECTIONS = [c.strip() for c in os.getenv("CLEANUP_COLLECTIONS", "repost").split(",") if c.strip()]
+OLDER_THAN_DAYS = int(os.getenv("OLDER_THAN_DAYS", "0"))
+CLEANUP_EXCLUDED = os.getenv("CLEANUP_EXCLUDED", "0").strip() not in ("", "0", "false", "no")
+
+
+def load_progress(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_progress(path, progress):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(progress, f)
+    os.replace(tmp, path)
+
+
+def list_page(client, did, collection, cursor, reverse=False):
+    # ruwe JSON: alleen uri + value nodig. reverse = oudste eerst
+    out = xrpc_query(client, "com.atproto.repo.listRecords", {
+        "repo": did, "collection": collection, "limit": PAGE_LIMIT, "cursor": cursor,
+        "reverse": "true" if reverse else None,
+    })
+    return out.get("records") or [], out.get("cursor")
+
+
+def record_created_ts(value, rkey):
+    created = parse_iso(value.get("createdAt"))
+    return int(created.timestamp()) if created else tid_timestamp(rkey)
+
+
+def make_selector(older_than_days, exclude_dids):
+    """
+    decide(value, rkey) -> "delete" / "keep" / "stop".
+    Alleen een leeftijdsgrens: oudste eerst lezen en stoppen bij het eerste jonge record.
+    """
+    if not older_than_days and not exclude_dids:
+        return None, False
+    cutoff_ts = int(time.time()) - older_than_days * 86400 if older_than_days else None
+    age_only = cutoff_ts is not None and not exclude_dids
+
+    def decide(value, rkey):
+        ts = record_created_ts(value, rkey)
+        if cutoff_ts is not None and ts is not None and ts < cutoff_ts:
+            return "delete"
+        subject = ((value.get("subject") or {}).get("uri") or "").replace("at://", "").split("/", 1)[0]
+        if subject.lower() in exclude_dids:
+            return "delete"
+        return "stop" if age_only else "keep"
+
+    return decide, age_only
+
+
+def delete_records(client, did, collection, rkeys):
+    """Eén applyWrites met deletes; mislukt de batch (bijv. record al weg), dan per record."""
+    writes = [{"$type": "com.atproto.repo.applyWrites#delete", "collection": collection, "rkey": k} for k in rkeys]
+    try:
+        client.com.atproto.repo.apply_writes({"repo": did, "writes": writes})
+        return list(rkeys)
+    except Exception as e:
+        print(f"⚠️ applyWrites ({len(rkeys)} deletes) mislukt: {e} — per record")
+    deleted = []
+    for rkey in rkeys:
+        try:
+            client.com.atproto.repo.delete_record({"repo": did, "collection": collection, "rkey": rkey})
+            deleted.append(rkey)
+        except Exception as e:
+            print(f"⚠️ delete {collection}/{rkey} mislukt: {e}")
+    return deleted
 
-def count_reposts(client, did):
-    cursor = None
-    total = 0
-    while True:
-        params = {"repo": did, "collection": COLLECTION, "limit": PAGE_LIMIT}
-        if cursor:
-            params["cursor"] = cursor
-        res = client.com.atproto.repo.list_records(params)
-        records = getattr(res, "records", []) or []
-        cursor = getattr(res, "cursor", None)
-
-        if not records:
-            break
-        total += len(records)
-        if not cursor:
-            break
-    return total
-
-def delete_batch(client, did, max_actions, sleep_s):
-    cursor = None
-    deleted = 0
-
-    while True:
-        params = {"repo": did, "collection": COLLECTION, "limit": PAGE_LIMIT}
-        if cursor:
-            params["cursor"] = cursor
-
-        res = client.com.atproto.repo.list_records(params)
-        records = getattr(res, "records", []) or []
-        cursor = getattr(res, "cursor", None)
-
-        if not records:
-            break
-
-        for rec in records:
-            uri = getattr(rec, "uri", None)
-            if not uri:
-                continue
-
-            parts = uri.replace("at://", "").split("/")
-            if len(parts) < 3:
-                continue
-
-            repo, collection, rkey = parts[0], parts[1], parts[2]
-            if repo != did or collection != COLLECTION:
-                continue
-
-            client.com.atproto.repo.delete_record(repo=repo, collection=collection, rkey=rkey)
-            deleted += 1
-
-            if deleted >= max_actions:
-                return deleted
-
-            time.sleep(sleep_s)
-
-        if not cursor:
-            break
 
+def forget_in_state(table, did, collection, subjects, rkeys):
+    # alleen entries die naar precies dit record wijzen (zelfde account)
+    for rkey in rkeys:
+        subject = subjects.get(rkey)
+        if subject and table.get(subject) == f"at://{did}/{collection}/{rkey}":
+            del table[subject]
+
+
+def clean_collection(client, did, collection, progress, max_actions, workers, budget, decide=None, reverse=False,
+                     table=None):
+    """
+    Eén pass over listRecords: per pagina de te verwijderen records direct als
+    applyWrites-batch weg, tot `workers` batches tegelijk. De cursor wordt pas opgeslagen
+    als alle batches ervoor klaar zijn, dus hervatten slaat nooit iets over.
+    `decide` None = alles weg; "stop" beëindigt de pass (oudste-eerst op leeftijd).
+    """
+    entry = progress.setdefault(collection, {"cursor": None, "deleted": 0})
+    if entry.get("reverse", False) != reverse:
+        entry["cursor"] = None  # andere leesrichting: cursor is niet bruikbaar
+    entry["reverse"] = reverse
+    cursor = entry["cursor"]
+    queued = 0
+    deleted = 0
+    inflight = deque()
+
+    def settle(limit):
+        # klaar-gemelde batches in volgorde verwerken; wachten tot er hoogstens `limit` onderweg zijn
+        nonlocal deleted
+        while inflight and (len(inflight) > limit or inflight[0][1].done()):
+            page_cursor, fut, reached, subjects = inflight.popleft()
+            done = fut.result()
+            deleted += len(done)
+            entry["deleted"] += len(done)
+            entry["cursor"] = page_cursor
+            if table is not None and done:
+                forget_in_state(table, did, collection, subjects, done)
+                table.conn.commit()
+            save_progress(PROGRESS_FILE, progress)
+            if done:
+                print(f"🧹 {collection}: {deleted} verwijderd deze run" + (f" (t/m {reached})" if reached else ""))
+
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as pool:
+        while queued < max_actions:
+            records, next_cursor = list_page(client, did, collection, cursor, reverse)
+            rkeys = []
+            subjects = {}
+            for rec in records:
+                parts = (rec.get("uri") or "").replace("at://", "").split("/")
+                if len(parts) < 3 or parts[0] != did or parts[1] != collection:
+                    continue
+                value = rec.get("value") or {}
+                verdict = decide(value, parts[2]) if decide else "delete"
+                if verdict == "stop":
+                    next_cursor = None  # rest is jonger: pass klaar
+                    break
+                if verdict == "delete":
+                    rkeys.append(parts[2])
+                    subjects[parts[2]] = (value.get("subject") or {}).get("uri")
+                    if queued + len(rkeys) >= max_actions:
+                        next_cursor = parts[2]  # hervatten na het laatste verwerkte record
+                        break
+            if rkeys and not budget.try_spend(len(rkeys)):  # delete = 1 punt
+                print(f"💰 Write budget op ({budget.report()}) — volgende run gaat verder")
+                break
+            if rkeys:
+                ts = tid_timestamp(rkeys[-1])
+                reached = datetime.fromtimestamp(ts, timezone.utc).date().isoformat() if ts else None
+                fut = pool.submit(delete_records, client, did, collection, rkeys)
+                inflight.append((next_cursor, fut, reached, subjects))
+                queued += len(rkeys)
+            else:
+                # niets te doen op deze pagina: cursor pas opslaan na de batches ervoor
+                skip = Future()
+                skip.set_result([])
+                inflight.append((next_cursor, skip, None, {}))
+            cursor = next_cursor
+            if not cursor:
+                break
+            settle(max(workers, 1) - 1)
+        settle(0)
+    # pass rond -> cursor None: de volgende run begint weer vooraan (nieuwe records)
     return deleted
 
+
 def main():
     username = os.getenv("BSKY_USERNAME_NB")
     password = os.getenv("BSKY_PASSWORD_NB")
@@ -73,21 +201,52 @@ def main():
         return
 
     max_actions = int(os.getenv("MAX_ACTIONS", "2000"))
-    sleep_s = float(os.getenv("SLEEP_SECONDS", "0.3"))
+    workers = int(os.getenv("DELETE_WORKERS", "1"))
 
-    client = Client()
-    client.login(username, password)
+    client = make_client()
+    login_client(client, username, password, SESSION_FILE)
     did = client.me.did
 
-    remaining = count_reposts(client, did)
-    print(f"📊 Remaining repost-records: {remaining}")
-
-    if remaining == 0:
-        print("✅ Nothing to do.")
-        return
+    exclude_dids = set()
+    if CLEANUP_EXCLUDED:
+        excl_uris = normalize_links(client, EXCLUDE_LISTS, normalize_list_uri, "Exclude lijst")
+        _, exclude_dids = load_exclude_sets(client, excl_uris, {})
+    decide, reverse = make_selector(OLDER_THAN_DAYS, exclude_dids)
+    if decide:
+        print(f"🎯 Selectief: ouder dan {OLDER_THAN_DAYS or '-'} dagen"
+              + (f" of subject uit exclude lijsten ({len(exclude_dids)} DIDs)" if exclude_dids else ""))
+
+    state = StateDB(STATE_DB_NB) if STATE_DB_NB and os.path.exists(STATE_DB_NB) else None
+    progress = load_progress(PROGRESS_FILE)
+    budget = WriteBudget(progress.setdefault("write_points", {}), WRITE_BUDGET_HOURLY, WRITE_BUDGET_DAILY)
+    try:
+        for name in CLEANUP_COLLECTIONS:
+            collection = COLLECTIONS.get(name, name)
+            resumed = (progress.get(collection) or {}).get("cursor")
+            if resumed:
+                print(f"⏯️ {collection}: hervatten vanaf cursor {resumed}")
+            table = state.tables[STATE_TABLES[collection]] if state and collection in STATE_TABLES else None
+            deleted = clean_collection(
+                client, did, collection, progress, max_actions, workers, budget,
+                decide=decide, reverse=reverse, table=table,
+            )
+            max_actions -= deleted
+            entry = progress[collection]
+            print(f"🧹 {collection} deleted this run: {deleted} (totaal: {entry['deleted']})")
+            if entry["cursor"]:
+                print("⏸️ Nog niet klaar — volgende run gaat verder vanaf de opgeslagen cursor")
+            elif deleted == 0:
+                print("✅ Nothing to do.")
+            else:
+                print("✅ Pass voltooid.")
+            if max_actions <= 0:
+                break
+    finally:
+        save_progress(PROGRESS_FILE, progress)
+        if state is not None:
+            state.save()
+            state.close()
 
-    deleted = delete_batch(client, did, max_actions=max_actions, sleep_s=sleep_s)
-    print(f"🧹 Deleted this run: {deleted}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()